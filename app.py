@@ -1,35 +1,468 @@
+import argparse
+import atexit
+import bisect
+import csv
+import difflib
+import json
+import logging
 import os
-from datetime import datetime
+import queue
+import random
+import re
+import sys
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 import time
 from abc import ABC, abstractmethod
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, Table, Date, DateTime
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
-from sqlalchemy.exc import IntegrityError 
+from sqlalchemy import create_engine, event, inspect, text, type_coerce, Column, Integer, String, Float, ForeignKey, Date, DateTime, Index, MetaData, Table, TypeDecorator, and_, case, delete, insert, literal, or_, select, tuple_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.orm import Session as OrmSession, declarative_base, object_session, relationship, scoped_session, sessionmaker
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy import func
 
-Base = declarative_base()
-engine = create_engine('sqlite:///restaurante.db', echo=False)
-Session = sessionmaker(bind=engine)
-session = Session()
-
-#====== TABELA ASSOCIATIVA ENTRE PEDIDO E PRODUTO ======
+#====== BANCO DE DADOS E SESSÕES ======
+
+URL_BANCO_PADRAO = 'sqlite:///restaurante.db'
+
+# Pragmas aplicados a cada nova conexão SQLite. O WAL deixa vários terminais
+# lendo enquanto um escreve; o busy_timeout faz a escrita concorrente esperar
+# a vez em vez de falhar com "database is locked".
+# synchronous=NORMAL só faz fsync nos checkpoints do WAL (uma queda de energia
+# pode levar os últimos commits); FULL faz fsync a cada commit. Escolha com
+# RESTAURANTE_SINCRONIZACAO ou definir_sincronizacao().
+NIVEIS_SINCRONIZACAO = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+def _nivel_sincronizacao(nivel):
+    nivel = nivel.strip().upper()
+    if nivel not in NIVEIS_SINCRONIZACAO:
+        raise ValueError(f"Sincronização inválida '{nivel}': use {', '.join(NIVEIS_SINCRONIZACAO)}.")
+    return nivel
+
+PRAGMAS_SQLITE = {
+    'journal_mode': 'WAL',
+    'synchronous': _nivel_sincronizacao(os.environ.get('RESTAURANTE_SINCRONIZACAO', 'NORMAL')),
+    'busy_timeout': 5000,
+    'cache_size': -16000,  # em KiB (16 MiB)
+    'temp_store': 'MEMORY',
+}
+
+def _aplicar_pragmas_sqlite(conexao, _registro):
+    cursor = conexao.cursor()
+    for pragma, valor in PRAGMAS_SQLITE.items():
+        cursor.execute(f'PRAGMA {pragma}={valor}')
+    cursor.close()
+
+def definir_sincronizacao(nivel):
+    """Troca o PRAGMA synchronous; vale para as conexões abertas daqui em diante"""
+    PRAGMAS_SQLITE['synchronous'] = _nivel_sincronizacao(nivel)
+    if engine is not None:
+        engine.dispose()
+
+def criar_engine(url=None, echo=False, **opcoes):
+    """Cria o engine do banco.
+
+    A URL vem do argumento, da variável de ambiente RESTAURANTE_DB_URL ou do
+    restaurante.db local. Opções extras (pool_size, max_overflow, ...) vão
+    direto para o create_engine, o que permite apontar para um servidor.
+    """
+    url = url or os.environ.get('RESTAURANTE_DB_URL', URL_BANCO_PADRAO)
+    if not url.startswith('sqlite'):
+        opcoes.setdefault('pool_pre_ping', True)
+    novo_engine = create_engine(url, echo=echo, **opcoes)
+    if novo_engine.dialect.name == 'sqlite':
+        event.listen(novo_engine, 'connect', _aplicar_pragmas_sqlite)
+    return novo_engine
 
-pedido_produto = Table(
-    'pedido_produto', Base.metadata,
-    Column('pedido_id', ForeignKey('pedidos.id'), primary_key=True),
-    Column('produto_id', ForeignKey('produtos.id'), primary_key=True)
+Base = declarative_base()
+# Importar o módulo não toca no banco: o engine é criado no primeiro uso
+# (obter_engine) e o esquema é conferido em inicializar().
+engine = None
+_trava_engine = threading.Lock()
+
+def obter_engine():
+    global engine
+    if engine is None:
+        with _trava_engine:
+            if engine is None:  # outra thread pode ter criado enquanto esta esperava
+                engine = criar_engine()
+    return engine
+
+class _Sessao(OrmSession):
+    """Sessão que só cria o engine quando a primeira consulta precisa dele"""
+
+    def get_bind(self, *args, **kwargs):
+        if self.bind is None:
+            self.bind = obter_engine()
+        return super().get_bind(*args, **kwargs)
+
+Session = sessionmaker(class_=_Sessao)
+# Sessão por thread: cada terminal/worker tem a sua, e session.remove()
+# descarta o mapa de identidade ao fim de cada operação.
+session = scoped_session(Session)
+
+def configurar_banco(url=None, **opcoes):
+    """Troca o banco em uso, descartando as sessões e o pool antigos"""
+    global engine
+    gravacao_em_lote.descarregar()
+    session.remove()
+    with _trava_engine:
+        if engine is not None:
+            engine.dispose()
+        engine = criar_engine(url, **opcoes)
+        Session.configure(bind=engine)
+    return engine
+
+@contextmanager
+def unidade_de_trabalho():
+    """Escopo transacional curto: commit no fim, rollback em erro e sessão descartada"""
+    sessao = session()
+    try:
+        yield sessao
+        sessao.commit()
+    except Exception:
+        sessao.rollback()
+        raise
+    finally:
+        session.remove()
+
+#====== INSTRUMENTAÇÃO DAS CONSULTAS ======
+# Liga com RESTAURANTE_INSTRUMENTACAO=1 ou pelo menu DIAGNÓSTICO. Desligada,
+# nenhum ouvinte fica registrado nos engines e não há custo algum.
+
+ResumoOperacao = namedtuple(
+    'ResumoOperacao', 'operacao execucoes consultas tempo_banco_ms tempo_total_ms max_consultas'
 )
+FORA_DE_OPERACAO = '(fora de operação)'
+
+class Instrumentacao:
+    """Conta consultas e tempo de banco por operação do usuário.
+
+    As consultas são atribuídas à operação mais interna em andamento na
+    thread. Uma mesma SELECT repetida limite_n_mais_1 vezes ou mais numa só
+    execução é marcada como suspeita de N+1, e consultas acima de
+    limite_lento_ms vão para o log de consultas lentas.
+    """
+
+    def __init__(self, limite_lento_ms=100, limite_n_mais_1=10, arquivo_lentas='consultas_lentas.log'):
+        self.limite_lento_ms = limite_lento_ms
+        self.limite_n_mais_1 = limite_n_mais_1
+        self.arquivo_lentas = arquivo_lentas
+        self.ativa = False
+        self.suspeitas = {}  # (operação, sql): maior número de repetições numa execução
+        self._totais = {}  # operação: [execuções, consultas, tempo no banco, tempo total, máximo de consultas]
+        self._trava = threading.Lock()
+        self._local = threading.local()
+        self._log = None
+
+    def ativar(self):
+        if not self.ativa:
+            event.listen(Engine, 'before_cursor_execute', self._antes_da_consulta)
+            event.listen(Engine, 'after_cursor_execute', self._depois_da_consulta)
+            event.listen(Engine, 'handle_error', self._erro_na_consulta)
+            self.ativa = True
+
+    def desativar(self):
+        if self.ativa:
+            event.remove(Engine, 'before_cursor_execute', self._antes_da_consulta)
+            event.remove(Engine, 'after_cursor_execute', self._depois_da_consulta)
+            event.remove(Engine, 'handle_error', self._erro_na_consulta)
+            self.ativa = False
+
+    def zerar(self):
+        with self._trava:
+            self._totais.clear()
+            self.suspeitas.clear()
+
+    @contextmanager
+    def operacao(self, nome):
+        if not self.ativa:
+            yield
+            return
+        pilha = self._local.__dict__.setdefault('pilha', [])
+        execucao = {'nome': nome, 'consultas': 0, 'tempo_banco': 0.0, 'sql': Counter()}
+        pilha.append(execucao)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            pilha.pop()
+            self._registrar(execucao, time.perf_counter() - inicio)
+
+    def _antes_da_consulta(self, conexao, cursor, sql, parametros, contexto, executemany):
+        conexao.info.setdefault('inicio_consultas', []).append(time.perf_counter())
+
+    def _depois_da_consulta(self, conexao, cursor, sql, parametros, contexto, executemany):
+        inicios = conexao.info.get('inicio_consultas')
+        if not inicios:
+            return  # a consulta começou antes de a instrumentação ser ligada
+        duracao = time.perf_counter() - inicios.pop()
+        pilha = getattr(self._local, 'pilha', None)
+        if pilha:
+            execucao = pilha[-1]
+            execucao['consultas'] += 1
+            execucao['tempo_banco'] += duracao
+            execucao['sql'][sql] += 1
+            nome = execucao['nome']
+        else:
+            nome = FORA_DE_OPERACAO
+            self._registrar({'nome': nome, 'consultas': 1, 'tempo_banco': duracao, 'sql': ()}, duracao)
+        if duracao * 1000 >= self.limite_lento_ms:
+            parametros = repr(parametros)
+            if len(parametros) > 200:
+                parametros = parametros[:200] + '...'
+            self._escrever_log(f"{duracao * 1000:.1f} ms [{nome}] {' '.join(sql.split())} {parametros}")
+
+    def _erro_na_consulta(self, contexto):
+        # consulta que falhou não passa pelo after_cursor_execute
+        if contexto.connection is not None:
+            contexto.connection.info.pop('inicio_consultas', None)
+
+    def _registrar(self, execucao, duracao):
+        repetidas = {
+            sql: vezes for sql, vezes in Counter(execucao['sql']).items()
+            if vezes >= self.limite_n_mais_1 and sql.lstrip().upper().startswith('SELECT')
+        }
+        nome = execucao['nome']
+        with self._trava:
+            totais = self._totais.setdefault(nome, [0, 0, 0.0, 0.0, 0])
+            totais[0] += 1
+            totais[1] += execucao['consultas']
+            totais[2] += execucao['tempo_banco']
+            totais[3] += duracao
+            totais[4] = max(totais[4], execucao['consultas'])
+            for sql, vezes in repetidas.items():
+                self.suspeitas[nome, sql] = max(self.suspeitas.get((nome, sql), 0), vezes)
+        for sql, vezes in repetidas.items():
+            self._escrever_log(f"possível N+1 [{nome}] {vezes}x {' '.join(sql.split())}")
+
+    def _escrever_log(self, mensagem):
+        if self._log is None:
+            self._log = logging.getLogger('restaurante.consultas')
+            self._log.setLevel(logging.INFO)
+            self._log.propagate = False
+            manipulador = logging.FileHandler(self.arquivo_lentas, delay=True, encoding='utf-8')
+            manipulador.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._log.addHandler(manipulador)
+        self._log.info(mensagem)
+
+    def resumo(self):
+        """Uma linha por operação, da que mais gastou tempo no banco para a que menos"""
+        with self._trava:
+            linhas = [
+                ResumoOperacao(nome, execucoes, consultas, tempo_banco * 1000, tempo_total * 1000, maximo)
+                for nome, (execucoes, consultas, tempo_banco, tempo_total, maximo) in self._totais.items()
+            ]
+        return sorted(linhas, key=lambda linha: linha.tempo_banco_ms, reverse=True)
+
+instrumentacao = Instrumentacao(
+    limite_lento_ms=float(os.environ.get('RESTAURANTE_CONSULTA_LENTA_MS', 100)),
+    limite_n_mais_1=int(os.environ.get('RESTAURANTE_LIMITE_N_MAIS_1', 10)),
+    arquivo_lentas=os.environ.get('RESTAURANTE_LOG_CONSULTAS_LENTAS', 'consultas_lentas.log'),
+)
+
+def exibir_instrumentacao(arquivo=None):
+    resumo = instrumentacao.resumo()
+    if not resumo:
+        print("Nenhuma consulta registrada.", file=arquivo)
+        return
+    print(f"{'Operação':<32} {'Exec.':>6} {'Consultas':>9} {'Cons./exec.':>11} {'Máx.':>5} {'Banco ms':>10} {'Total ms':>10}",
+          file=arquivo)
+    for linha in resumo:
+        print(f"{linha.operacao:<32} {linha.execucoes:>6} {linha.consultas:>9} "
+              f"{linha.consultas / linha.execucoes:>11.1f} {linha.max_consultas:>5} "
+              f"{linha.tempo_banco_ms:>10.1f} {linha.tempo_total_ms:>10.1f}", file=arquivo)
+    if instrumentacao.suspeitas:
+        print("\nPossíveis N+1 (mesma SELECT repetida numa única execução):", file=arquivo)
+        for (operacao, sql), vezes in instrumentacao.suspeitas.items():
+            print(f"  [{operacao}] {vezes}x {' '.join(sql.split())[:100]}", file=arquivo)
+
+if os.environ.get('RESTAURANTE_INSTRUMENTACAO') == '1':
+    instrumentacao.ativar()
+    atexit.register(exibir_instrumentacao, sys.stderr)
+
+#====== DINHEIRO ======
+
+CENTAVO = Decimal('0.01')
+
+def para_dinheiro(valor):
+    """Converte número ou texto (aceita vírgula decimal) em Decimal com duas casas"""
+    if valor is None:
+        return None
+    if isinstance(valor, float):
+        valor = repr(valor)
+    elif isinstance(valor, str):
+        valor = valor.strip().replace(',', '.')
+    try:
+        return Decimal(valor).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f"Valor monetário inválido: {valor!r}")
+
+class Dinheiro(TypeDecorator):
+    """Valor monetário guardado como centavos inteiros e lido como Decimal"""
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, valor, dialect):
+        if valor is None:
+            return None
+        return int(para_dinheiro(valor) * 100)
+
+    def process_result_value(self, valor, dialect):
+        if valor is None:
+            return None
+        return (Decimal(valor) / 100).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+#====== EXCEÇÕES ======
+
+class EstoqueInsuficienteError(ValueError):
+    """Levantada quando um ou mais produtos do pedido não têm estoque suficiente"""
+
+    def __init__(self, faltantes):
+        # faltantes: {nome: (quantidade solicitada, quantidade disponível)}
+        self.faltantes = faltantes
+        nomes = ', '.join(f"'{nome}'" for nome in faltantes)
+        super().__init__(f"Produto(s) fora de estoque: {nomes}.")
+
+class RegistroDuplicadoError(ValueError):
+    """Levantada quando o cadastro viola uma restrição de unicidade (CPF, nome)"""
+
+class RegistroNaoEncontradoError(LookupError):
+    """Levantada quando o registro pedido pelo id ou CPF não existe"""
+
+#====== PERÍODOS ======
+
+# Turnos do restaurante: (hora inicial, hora final) em horas cheias
+TURNOS = {
+    'madrugada': (0, 6),
+    'manhã': (6, 11),
+    'almoço': (11, 15),
+    'tarde': (15, 18),
+    'jantar': (18, 24),
+}
+
+def intervalo_do_dia(dia):
+    inicio = datetime.combine(dia, datetime.min.time())
+    return inicio, inicio + timedelta(days=1)
+
+def intervalo_do_turno(dia, turno):
+    hora_inicial, hora_final = TURNOS[turno]
+    inicio = datetime.combine(dia, datetime.min.time())
+    return inicio + timedelta(hours=hora_inicial), inicio + timedelta(hours=hora_final)
+
+def intervalo_do_mes(ano, mes):
+    inicio = datetime(ano, mes, 1)
+    return inicio, datetime(ano + mes // 12, mes % 12 + 1, 1)
 
 #====== CLASSES COM SQLALCHEMY ======
 
+class PeriodoMixin:
+    """Consultas por intervalo [inicio, fim) de criado_em, resolvidas pelo índice da coluna"""
+
+    @classmethod
+    def no_periodo(cls, inicio, fim):
+        """Consulta (Query) dos registros criados no intervalo, em ordem cronológica"""
+        return (session.query(cls).filter(cls.criado_em >= inicio, cls.criado_em < fim)
+                .order_by(cls.criado_em, cls.id))
+
+    @classmethod
+    def do_dia(cls, dia):
+        return cls.no_periodo(*intervalo_do_dia(dia))
+
+    @classmethod
+    def do_turno(cls, dia, turno):
+        return cls.no_periodo(*intervalo_do_turno(dia, turno))
+
+    @classmethod
+    def do_mes(cls, ano, mes):
+        return cls.no_periodo(*intervalo_do_mes(ano, mes))
+
+    @classmethod
+    def totais_no_periodo(cls, inicio, fim):
+        """(quantidade, valor total) dos registros criados no intervalo"""
+        quantidade, total = (
+            session.query(func.count(cls.id), func.sum(cls._valor))
+            .filter(cls.criado_em >= inicio, cls.criado_em < fim)
+            .one()
+        )
+        return quantidade, total or Decimal('0.00')
+
+class ValorEstoqueMixin:
+    """Valorização de estoque (valor * quantidade) calculada direto no banco"""
+
+    @classmethod
+    def _valor_imobilizado(cls):
+        # centavos * quantidade continua em centavos: soma inteira e exata
+        return type_coerce(cls._valor * cls._quantidade, Dinheiro)
+
+    @classmethod
+    def valor_total_estoque(cls):
+        """Calcula o valor total em estoque"""
+        return session.query(func.coalesce(func.sum(cls._valor_imobilizado()), 0)).scalar()
+
+    @classmethod
+    def valor_estoque_por_item(cls, limite=None):
+        """Valor imobilizado por item, do maior para o menor (com limite, só os N primeiros)"""
+        valor_total = cls._valor_imobilizado().label('valor_total')
+        consulta = (
+            session.query(cls.id, cls._nome.label('nome'), cls._quantidade.label('quantidade'), valor_total)
+            .order_by(valor_total.desc(), cls.id)
+        )
+        if limite is not None:
+            consulta = consulta.limit(limite)
+        return consulta.all()
+
+# ====== IDADE ======
+# (idade mínima, idade máxima); None na última faixa significa "em diante"
+FAIXAS_ETARIAS = [(0, 17), (18, 25), (26, 35), (36, 50), (51, 65), (66, None)]
+SEM_IDADE = 'sem idade'
+
+FaixaEtaria = namedtuple('FaixaEtaria', 'faixa total')
+ClienteIdade = namedtuple('ClienteIdade', 'nome idade')
+
+def idade_em(data_nascimento, hoje=None):
+    """Idade completa em anos na data `hoje`"""
+    hoje = hoje or date.today()
+    return hoje.year - data_nascimento.year - ((hoje.month, hoje.day) < (data_nascimento.month, data_nascimento.day))
+
+def _anos_antes(hoje, anos):
+    """Mesmo dia `anos` anos antes; 29/02 vira 28/02 em ano não bissexto"""
+    try:
+        return hoje.replace(year=hoje.year - anos)
+    except ValueError:
+        return hoje.replace(year=hoje.year - anos, day=28)
+
+def _nascidos_com_idade(coluna, idade_min=None, idade_max=None, hoje=None):
+    """Condições sobre a data de nascimento para a idade ficar entre os limites.
+
+    Comparações de intervalo sobre a própria coluna, que o índice atende
+    sem calcular a idade linha a linha.
+    """
+    hoje = hoje or date.today()
+    condicoes = []
+    if idade_min is not None:
+        condicoes.append(coluna <= _anos_antes(hoje, idade_min))
+    if idade_max is not None:
+        condicoes.append(coluna > _anos_antes(hoje, idade_max + 1))
+    return and_(*condicoes)
+
+def _rotulo_faixa(idade_min, idade_max):
+    return f'{idade_min}+' if idade_max is None else f'{idade_min}-{idade_max}'
+
 class Cliente(Base):
     __tablename__ = 'clientes'
     id = Column(Integer, primary_key=True)
     _nome = Column('nome', String)
     _cpf = Column('cpf', String, unique=True)
-    _idade = Column('idade', Integer)
-    _data_nascimento = Column('data_nascimento', Date)
+    _idade = Column('idade', Integer, index=True)  # informada no cadastro; vale só para quem não tem data de nascimento
+    _data_nascimento = Column('data_nascimento', Date, index=True)
 
     pedidos = relationship("Pedido", back_populates="cliente")
     pagamentos = relationship("Pagamento", back_populates="cliente")
@@ -54,6 +487,8 @@ class Cliente(Base):
 
     @property
     def idade(self):
+        if self._data_nascimento:
+            return idade_em(self._data_nascimento)
         return self._idade
 
     @idade.setter
@@ -73,8 +508,56 @@ class Cliente(Base):
         return session.query(cls).count()
 
     @classmethod
-    def clientes_por_faixa_etaria(cls, idade_min, idade_max):
-        return session.query(cls).filter(cls._idade.between(idade_min, idade_max)).all()
+    def _com_idade(cls, idade_min, idade_max, hoje=None):
+        # quem não tem data de nascimento fica com a idade informada no cadastro
+        return or_(
+            _nascidos_com_idade(cls._data_nascimento, idade_min, idade_max, hoje),
+            and_(cls._data_nascimento.is_(None), cls._idade.between(idade_min, idade_max)),
+        )
+
+    @classmethod
+    def clientes_por_faixa_etaria(cls, idade_min, idade_max, hoje=None):
+        """(nome, idade) dos clientes na faixa, calculada pela data de nascimento"""
+        hoje = hoje or date.today()
+        linhas = (
+            session.query(cls._nome, cls._data_nascimento, cls._idade)
+            .filter(cls._com_idade(idade_min, idade_max, hoje))
+            .order_by(cls._data_nascimento.desc(), cls._nome)
+        )
+        return [
+            ClienteIdade(nome, idade_em(nascimento, hoje) if nascimento else idade)
+            for nome, nascimento, idade in linhas
+        ]
+
+    @classmethod
+    def histograma_faixas_etarias(cls, faixas=FAIXAS_ETARIAS, hoje=None):
+        """Quantidade de clientes em cada faixa etária num único GROUP BY.
+
+        Retorna todas as faixas, mesmo as vazias, e por último os clientes
+        sem data de nascimento nem idade, se houver.
+        """
+        hoje = hoje or date.today()
+        rotulos = [_rotulo_faixa(idade_min, idade_max) for idade_min, idade_max in faixas]
+        pela_data = case(
+            *[(_nascidos_com_idade(cls._data_nascimento, idade_max=idade_max, hoje=hoje), rotulo)
+              for (_, idade_max), rotulo in zip(faixas, rotulos) if idade_max is not None],
+            else_=rotulos[-1],
+        )
+        pela_idade = case(
+            *[(cls._idade <= idade_max, rotulo)
+              for (_, idade_max), rotulo in zip(faixas, rotulos) if idade_max is not None],
+            else_=rotulos[-1],
+        )
+        faixa = case(
+            (cls._data_nascimento.isnot(None), pela_data),
+            (cls._idade.isnot(None), pela_idade),
+            else_=SEM_IDADE,
+        ).label('faixa')
+        totais = dict(session.query(faixa, func.count(cls.id)).group_by(faixa).all())
+        histograma = [FaixaEtaria(rotulo, totais.get(rotulo, 0)) for rotulo in rotulos]
+        if totais.get(SEM_IDADE):
+            histograma.append(FaixaEtaria(SEM_IDADE, totais[SEM_IDADE]))
+        return histograma
 
 class Funcionario(Base):
     __tablename__ = 'funcionarios'
@@ -84,7 +567,7 @@ class Funcionario(Base):
     _idade = Column('idade', Integer)
     _data_nascimento = Column('data_nascimento', Date)
     _cargo = Column('cargo', String)
-    _salario = Column('salario', Float)
+    _salario = Column('salario_centavos', Dinheiro)
 
     def __init__(self, nome, cpf, idade, data_nascimento, cargo, salario):
         self._nome = nome
@@ -92,7 +575,7 @@ class Funcionario(Base):
         self._idade = idade
         self._data_nascimento = data_nascimento
         self._cargo = cargo
-        self._salario = salario
+        self._salario = para_dinheiro(salario)
 
     @property
     def nome(self):
@@ -136,30 +619,67 @@ class Funcionario(Base):
 
     @salario.setter
     def salario(self, value):
-        self._salario = value
+        self._salario = para_dinheiro(value)
         
         
+    @classmethod
+    def resumo_por_cargo(cls):
+        """Quantidade e estatísticas salariais de cada cargo numa única consulta agregada.
+
+        A média é a soma inteira de centavos dividida pela contagem, em Decimal.
+        """
+        linhas = (
+            session.query(
+                cls._cargo,
+                func.count(cls.id),
+                func.count(cls._salario),
+                func.sum(cls._salario),
+                func.min(cls._salario),
+                func.max(cls._salario),
+            )
+            .group_by(cls._cargo)
+            .order_by(cls._cargo)
+        )
+        return [
+            ResumoCargo(cargo, total, com_salario, soma, _media(soma, com_salario), minimo, maximo)
+            for cargo, total, com_salario, soma, minimo, maximo in linhas
+        ]
+
     @classmethod
     def total_funcionarios_por_cargo(cls):
-        cargos = session.query(cls._cargo).distinct()
-        return {cargo[0]: session.query(cls).filter(cls._cargo == cargo[0]).count() 
-                for cargo in cargos}
+        return {linha.cargo: linha.total for linha in cls.resumo_por_cargo()}
 
     @classmethod
     def media_salarial(cls):
-        return session.query(func.avg(cls._salario)).scalar()
+        soma, quantidade = session.query(func.sum(cls._salario), func.count(cls._salario)).one()
+        return _media(soma, quantidade)
+
+ResumoCargo = namedtuple('ResumoCargo', 'cargo total com_salario soma media minimo maximo')
+
+def _media(soma, quantidade):
+    if not quantidade:
+        return None
+    return (soma / quantidade).quantize(CENTAVO, rounding=ROUND_HALF_UP)
 
-class Produto(Base):
+class Produto(ValorEstoqueMixin, Base):
     __tablename__ = 'produtos'
     id = Column(Integer, primary_key=True)
     _nome = Column('nome', String)
-    _valor = Column('valor', Float)
+    _valor = Column('valor_centavos', Dinheiro)
     _quantidade = Column('quantidade', Integer)
+    cardapio_item_id = Column(Integer, ForeignKey('cardapio.id'), index=True)
 
-    def __init__(self, nome, valor, quantidade=1):
+    cardapio_item = relationship("CardapioItem", back_populates="produtos")
+    receita = relationship("Receita", back_populates="produto", cascade="all, delete-orphan")
+
+    def __init__(self, nome, valor, quantidade=1, cardapio_item=None, ingredientes=None):
+        """ingredientes: {EstoqueItem: quantidade consumida por unidade vendida}"""
         self._nome = nome
-        self._valor = valor
+        self._valor = para_dinheiro(valor)
         self._quantidade = quantidade
+        self.cardapio_item = cardapio_item
+        if ingredientes:
+            self.definir_receita(ingredientes)
 
     @property
     def nome(self):
@@ -175,7 +695,7 @@ class Produto(Base):
 
     @valor.setter
     def valor(self, value):
-        self._valor = value
+        self._valor = para_dinheiro(value)
 
     @property
     def quantidade(self):
@@ -185,30 +705,30 @@ class Produto(Base):
     def quantidade(self, value):
         self._quantidade = value
         
+    def definir_receita(self, ingredientes):
+        """Troca a receita do produto: {EstoqueItem: quantidade por unidade vendida}"""
+        self.receita = [Receita(estoque_item, quantidade) for estoque_item, quantidade in ingredientes.items()]
+
     @classmethod
     def produtos_abaixo_estoque(cls, limite=5):
         """Retorna produtos com quantidade abaixo do limite especificado"""
         return session.query(cls).filter(cls._quantidade < limite).all()
 
-    @classmethod
-    def valor_total_estoque(cls):
-        """Calcula o valor total em estoque"""
-        produtos = session.query(cls).all()
-        return sum(p._valor * p._quantidade for p in produtos)
-
-class Pagamento(Base):
+class Pagamento(PeriodoMixin, Base):
     __tablename__ = 'pagamentos'
     id = Column(Integer, primary_key=True)
     _tipo = Column('tipo', String)
-    _valor = Column('valor', Float)
-    cliente_id = Column(Integer, ForeignKey('clientes.id'))
+    _valor = Column('valor_centavos', Dinheiro)
+    cliente_id = Column(Integer, ForeignKey('clientes.id'), index=True)
+    criado_em = Column(DateTime, default=datetime.now, index=True)
 
     cliente = relationship("Cliente", back_populates="pagamentos")
 
     def __init__(self, tipo, valor, cliente):
         self._tipo = tipo
-        self._valor = valor
+        self._valor = para_dinheiro(valor)
         self.cliente = cliente
+        self.criado_em = datetime.now()
 
     @property
     def tipo(self):
@@ -218,17 +738,42 @@ class Pagamento(Base):
     def valor(self):
         return self._valor
 
-class EstoqueItem(Base):
+    @classmethod
+    def listar(cls, tipo=None, cliente_id=None, valor_min=None, valor_max=None, apos_id=None, limite=20):
+        """Uma página de pagamentos com o nome do cliente, numa única consulta com JOIN.
+
+        A paginação é por cursor: passe em apos_id o id do último pagamento da
+        página anterior.
+        """
+        consulta = (
+            session.query(cls.id, Cliente._nome.label('cliente'), cls._tipo.label('tipo'), cls._valor.label('valor'))
+            .join(Cliente, cls.cliente_id == Cliente.id)
+        )
+        if tipo:
+            consulta = consulta.filter(func.lower(cls._tipo) == tipo.lower())
+        if cliente_id is not None:
+            consulta = consulta.filter(cls.cliente_id == cliente_id)
+        if valor_min is not None:
+            consulta = consulta.filter(cls._valor >= valor_min)
+        if valor_max is not None:
+            consulta = consulta.filter(cls._valor <= valor_max)
+        if apos_id is not None:
+            consulta = consulta.filter(cls.id > apos_id)
+        return consulta.order_by(cls.id).limit(limite).all()
+
+class EstoqueItem(ValorEstoqueMixin, Base):
     __tablename__ = 'estoque'
     id = Column(Integer, primary_key=True)
-    _nome = Column('nome', String)
+    _nome = Column('nome', String, unique=True, index=True)
     _quantidade = Column('quantidade', Integer)
-    _valor = Column('valor', Float)
+    _valor = Column('valor_centavos', Dinheiro)
+
+    receitas = relationship("Receita", back_populates="estoque_item")
 
     def __init__(self, nome, quantidade, valor):
         self._nome = nome
         self._quantidade = quantidade
-        self._valor = valor
+        self._valor = para_dinheiro(valor)
 
     @property
     def nome(self):
@@ -252,33 +797,80 @@ class EstoqueItem(Base):
 
     @valor.setter
     def valor(self, value):
-        self._valor = value
+        self._valor = para_dinheiro(value)
+
+class Receita(Base):
+    """Ficha técnica: quanto de cada item do estoque uma unidade do produto consome"""
+    __tablename__ = 'receitas'
+    produto_id = Column(Integer, ForeignKey('produtos.id'), primary_key=True)
+    estoque_item_id = Column(Integer, ForeignKey('estoque.id'), primary_key=True, index=True)
+    _quantidade = Column('quantidade', Integer, nullable=False, default=1)
 
-class Pedido(Base):
+    produto = relationship("Produto", back_populates="receita")
+    estoque_item = relationship("EstoqueItem", back_populates="receitas")
+
+    def __init__(self, estoque_item, quantidade=1):
+        self.estoque_item = estoque_item
+        self._quantidade = quantidade
+
+    @property
+    def quantidade(self):
+        return self._quantidade
+
+class ItemPedido(Base):
+    __tablename__ = 'itens_pedido'
+    id = Column(Integer, primary_key=True)
+    pedido_id = Column(Integer, ForeignKey('pedidos.id'), nullable=False, index=True)
+    produto_id = Column(Integer, ForeignKey('produtos.id'), nullable=False)
+    _quantidade = Column('quantidade', Integer, nullable=False)
+    _valor_unitario = Column('valor_unitario_centavos', Dinheiro, nullable=False)
+
+    pedido = relationship("Pedido", back_populates="itens")
+    produto = relationship("Produto")
+
+    def __init__(self, produto, quantidade=1):
+        if quantidade <= 0:
+            raise ValueError(f"Quantidade inválida para '{produto._nome}': {quantidade}.")
+        self.produto = produto
+        self._quantidade = quantidade
+        # Preço congelado no momento da venda
+        self._valor_unitario = produto._valor
+
+    @property
+    def quantidade(self):
+        return self._quantidade
+
+    @property
+    def valor_unitario(self):
+        return self._valor_unitario
+
+    @property
+    def subtotal(self):
+        return self._valor_unitario * self._quantidade
+
+class Pedido(PeriodoMixin, Base):
     __tablename__ = 'pedidos'
     id = Column(Integer, primary_key=True)
     _comanda = Column('comanda', String)
-    _valor = Column('valor', Float)
-    cliente_id = Column(Integer, ForeignKey('clientes.id'))
+    _valor = Column('valor_centavos', Dinheiro)
+    cliente_id = Column(Integer, ForeignKey('clientes.id'), index=True)
+    criado_em = Column(DateTime, default=datetime.now, index=True)
 
     cliente = relationship("Cliente", back_populates="pedidos")
-    produtos = relationship("Produto", secondary=pedido_produto)
+    itens = relationship("ItemPedido", back_populates="pedido", cascade="all, delete-orphan")
 
     def __init__(self, cliente, produtos):
-        self.cliente = cliente
-        self._produtos = []
-        self._valor = 0.0
-
-        for p in produtos:
-            estoque = session.query(EstoqueItem).filter_by(_nome=p._nome).first()
-            if estoque and estoque._quantidade > 0:
-                self._produtos.append(p)
-                estoque._quantidade -= 1
-                self._valor += p._valor
-            else:
-                raise ValueError(f"Produto '{p._nome}' fora de estoque.")
+        """produtos: Produto avulsos (repetições somam) ou pares (produto, quantidade)"""
+        itens = self._agrupar_itens(produtos)
+        reservar_estoque(itens)
+
+        numero = SequenciaComanda.proximo_numero(cliente)
+        self._comanda = f"CPF: {cliente._cpf[-3:]}\nPedidos: {numero}"
 
-        self._comanda = f"CPF: {cliente._cpf[-3:]}\nPedidos: {len(cliente.pedidos) + 1}"
+        self.itens = itens
+        self.cliente = cliente
+        self._valor = sum((item.subtotal for item in itens), Decimal('0.00'))
+        self.criado_em = datetime.now()
 
     @property
     def comanda(self):
@@ -290,17 +882,63 @@ class Pedido(Base):
 
     @property
     def produtos(self):
-        return self._produtos
+        return [item.produto for item in self.itens]
+
+    @staticmethod
+    def _agrupar_itens(produtos):
+        quantidades = {}
+        for entrada in produtos:
+            produto, quantidade = entrada if isinstance(entrada, tuple) else (entrada, 1)
+            quantidades[produto] = quantidades.get(produto, 0) + quantidade
+        return [ItemPedido(produto, quantidade) for produto, quantidade in quantidades.items()]
+
+class SequenciaComanda(Base):
+    __tablename__ = 'sequencias_comanda'
+    cliente_id = Column(Integer, ForeignKey('clientes.id'), primary_key=True)
+    _ultimo_numero = Column('ultimo_numero', Integer, nullable=False)
+
+    @classmethod
+    def proximo_numero(cls, cliente):
+        """Reserva de forma atômica o próximo número de comanda do cliente.
+
+        O caso comum é um único UPDATE ... RETURNING na linha do contador. Só o
+        primeiro pedido de cada cliente conta o histórico para semear a
+        sequência; o ON CONFLICT cobre dois terminais semeando ao mesmo tempo.
+        """
+        if cliente.id is None:
+            session.add(cliente)
+            session.flush()
+
+        numero = session.execute(
+            update(cls)
+            .where(cls.cliente_id == cliente.id)
+            .values({cls._ultimo_numero: cls._ultimo_numero + 1})
+            .returning(cls._ultimo_numero)
+        ).scalar()
+        if numero is not None:
+            return numero
+
+        historico = select(cliente.id, func.count(Pedido.id) + 1).where(Pedido.cliente_id == cliente.id)
+        semear = (
+            _insert(cls)
+            .from_select(['cliente_id', 'ultimo_numero'], historico)
+            .on_conflict_do_update(index_elements=['cliente_id'],
+                                   set_={'ultimo_numero': cls.__table__.c.ultimo_numero + 1})
+            .returning(cls._ultimo_numero)
+        )
+        return session.execute(semear).scalar()
 
 class CardapioItem(Base):
     __tablename__ = 'cardapio'
     id = Column(Integer, primary_key=True)
-    _nome = Column('nome', String)
-    _valor = Column('valor', Float)
+    _nome = Column('nome', String, unique=True, index=True)
+    _valor = Column('valor_centavos', Dinheiro)
+
+    produtos = relationship("Produto", back_populates="cardapio_item")
 
     def __init__(self, nome, valor):
         self._nome = nome
-        self._valor = valor
+        self._valor = para_dinheiro(valor)
 
     @property
     def nome(self):
@@ -316,7 +954,893 @@ class CardapioItem(Base):
 
     @valor.setter
     def valor(self, value):
-        self._valor = value
+        self._valor = para_dinheiro(value)
+
+def _insert(entidade, dialeto=None):
+    """INSERT com suporte a ON CONFLICT no dialeto do banco em uso"""
+    if (dialeto or session.get_bind().dialect.name) == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(entidade)
+
+# ====== RESUMOS DE VENDAS (MATERIALIZADOS) ======
+# Totais por dia/hora mantidos a cada pedido ou pagamento gravado, na mesma
+# transação, para que os relatórios leiam poucas linhas qualquer que seja o
+# tamanho do histórico. São fatos de venda: não recuam se o pedido for apagado.
+
+class ResumoVendasHora(Base):
+    __tablename__ = 'resumo_vendas_hora'
+    hora = Column(DateTime, primary_key=True)
+    pedidos = Column(Integer, nullable=False, default=0)
+    receita = Column(Dinheiro, nullable=False, default=0)
+
+    @classmethod
+    def do_dia(cls, dia):
+        inicio = datetime.combine(dia, datetime.min.time())
+        return (session.query(cls).filter(cls.hora >= inicio, cls.hora < inicio + timedelta(days=1))
+                .order_by(cls.hora).all())
+
+class ResumoVendasDia(Base):
+    __tablename__ = 'resumo_vendas_dia'
+    dia = Column(Date, primary_key=True)
+    pedidos = Column(Integer, nullable=False, default=0)
+    receita = Column(Dinheiro, nullable=False, default=0)
+
+    @property
+    def ticket_medio(self):
+        return _media(self.receita, self.pedidos)
+
+    @classmethod
+    def periodo(cls, inicio, fim):
+        return session.query(cls).filter(cls.dia.between(inicio, fim)).order_by(cls.dia).all()
+
+class ResumoPagamentosDia(Base):
+    __tablename__ = 'resumo_pagamentos_dia'
+    dia = Column(Date, primary_key=True)
+    tipo = Column(String, primary_key=True)
+    quantidade = Column(Integer, nullable=False, default=0)
+    valor = Column(Dinheiro, nullable=False, default=0)
+
+    @classmethod
+    def mix(cls, inicio, fim):
+        """Quantidade e valor por forma de pagamento no período, do maior valor para o menor"""
+        valor = func.sum(cls.valor)
+        return (
+            session.query(cls.tipo, func.sum(cls.quantidade).label('quantidade'), valor.label('valor'))
+            .filter(cls.dia.between(inicio, fim))
+            .group_by(cls.tipo)
+            .order_by(valor.desc())
+            .all()
+        )
+
+class ResumoProdutosDia(Base):
+    __tablename__ = 'resumo_produtos_dia'
+    dia = Column(Date, primary_key=True)
+    produto_id = Column(Integer, ForeignKey('produtos.id'), primary_key=True)
+    quantidade = Column(Integer, nullable=False, default=0)
+    receita = Column(Dinheiro, nullable=False, default=0)
+
+    @classmethod
+    def mais_vendidos(cls, inicio, fim, limite=10):
+        quantidade = func.sum(cls.quantidade)
+        return (
+            session.query(Produto._nome.label('nome'), quantidade.label('quantidade'), func.sum(cls.receita).label('receita'))
+            .join(Produto, Produto.id == cls.produto_id)
+            .filter(cls.dia.between(inicio, fim))
+            .group_by(cls.produto_id, Produto._nome)
+            .order_by(quantidade.desc())
+            .limit(limite)
+            .all()
+        )
+
+def _acumular(conexao, modelo, chave, incrementos):
+    """Soma os incrementos à linha da chave, criando-a se preciso (INSERT ... ON CONFLICT DO UPDATE)"""
+    tabela = modelo.__table__
+    comando = _insert(tabela, conexao.dialect.name).values(**chave, **incrementos)
+    comando = comando.on_conflict_do_update(
+        index_elements=list(chave),
+        set_={coluna: tabela.c[coluna] + comando.excluded[coluna] for coluna in incrementos},
+    )
+    conexao.execute(comando)
+
+def _momento_da_venda(registro):
+    return registro.criado_em or datetime.now()
+
+@event.listens_for(Pedido, 'after_insert')
+def _resumir_pedido(_mapper, conexao, pedido):
+    momento = _momento_da_venda(pedido)
+    incrementos = {'pedidos': 1, 'receita': pedido._valor or 0}
+    _acumular(conexao, ResumoVendasHora, {'hora': momento.replace(minute=0, second=0, microsecond=0)}, incrementos)
+    _acumular(conexao, ResumoVendasDia, {'dia': momento.date()}, incrementos)
+
+@event.listens_for(ItemPedido, 'after_insert')
+def _resumir_item_pedido(_mapper, conexao, item):
+    momento = _momento_da_venda(item.pedido)
+    _acumular(conexao, ResumoProdutosDia, {'dia': momento.date(), 'produto_id': item.produto_id},
+              {'quantidade': item._quantidade, 'receita': item.subtotal})
+
+@event.listens_for(Pagamento, 'after_insert')
+def _resumir_pagamento(_mapper, conexao, pagamento):
+    momento = _momento_da_venda(pagamento)
+    _acumular(conexao, ResumoPagamentosDia, {'dia': momento.date(), 'tipo': (pagamento._tipo or '').strip().lower()},
+              {'quantidade': 1, 'valor': pagamento._valor or 0})
+
+def reconstruir_resumos(tamanho_lote=5000):
+    """Recalcula todos os resumos a partir de pedidos e pagamentos datados.
+
+    Lê as tabelas em streaming e acumula em memória um total por hora, dia,
+    tipo e produto; serve para bancos antigos e para conferência. Só lê as
+    tabelas de origem: pedidos e pagamentos de antes da coluna criado_em não
+    têm dia nem hora e ficam fora dos resumos.
+    """
+    horas, dias, pagamentos, produtos = Counter(), Counter(), Counter(), Counter()
+    pedidos_por_hora, pedidos_por_dia, pagamentos_por_dia, vendidos = Counter(), Counter(), Counter(), Counter()
+
+    with obter_engine().begin() as conexao:
+        consulta = select(Pedido.criado_em, Pedido._valor).where(Pedido.criado_em.is_not(None))
+        for criado_em, valor in conexao.execute(consulta.execution_options(yield_per=tamanho_lote)):
+            hora = criado_em.replace(minute=0, second=0, microsecond=0)
+            horas[hora] += valor or 0
+            pedidos_por_hora[hora] += 1
+            dias[criado_em.date()] += valor or 0
+            pedidos_por_dia[criado_em.date()] += 1
+
+        consulta = (select(Pedido.criado_em, ItemPedido.produto_id, ItemPedido._quantidade, ItemPedido._valor_unitario)
+                    .join(Pedido, Pedido.id == ItemPedido.pedido_id).where(Pedido.criado_em.is_not(None)))
+        for criado_em, produto_id, quantidade, valor_unitario in conexao.execute(
+                consulta.execution_options(yield_per=tamanho_lote)):
+            chave = (criado_em.date(), produto_id)
+            vendidos[chave] += quantidade
+            produtos[chave] += valor_unitario * quantidade
+
+        consulta = select(Pagamento.criado_em, Pagamento._tipo, Pagamento._valor).where(Pagamento.criado_em.is_not(None))
+        for criado_em, tipo, valor in conexao.execute(consulta.execution_options(yield_per=tamanho_lote)):
+            chave = (criado_em.date(), (tipo or '').strip().lower())
+            pagamentos_por_dia[chave] += 1
+            pagamentos[chave] += valor or 0
+
+        for modelo in (ResumoVendasHora, ResumoVendasDia, ResumoPagamentosDia, ResumoProdutosDia):
+            conexao.execute(delete(modelo))
+        lotes = (
+            (ResumoVendasHora, [{'hora': h, 'pedidos': pedidos_por_hora[h], 'receita': horas[h]} for h in horas]),
+            (ResumoVendasDia, [{'dia': d, 'pedidos': pedidos_por_dia[d], 'receita': dias[d]} for d in dias]),
+            (ResumoPagamentosDia, [{'dia': d, 'tipo': t, 'quantidade': pagamentos_por_dia[(d, t)],
+                                    'valor': pagamentos[(d, t)]} for d, t in pagamentos]),
+            (ResumoProdutosDia, [{'dia': d, 'produto_id': p, 'quantidade': vendidos[(d, p)],
+                                  'receita': produtos[(d, p)]} for d, p in vendidos]),
+        )
+        for modelo, linhas in lotes:
+            if linhas:
+                conexao.execute(insert(modelo), linhas)
+
+def fechamento_do_dia(dia):
+    """Totais de pedidos e pagamentos do dia, lidos por faixa do índice de criado_em"""
+    inicio, fim = intervalo_do_dia(dia)
+    pedidos, vendido = Pedido.totais_no_periodo(inicio, fim)
+    tipo = func.lower(func.trim(Pagamento._tipo))
+    por_tipo = (
+        session.query(tipo, func.count(Pagamento.id), func.sum(Pagamento._valor))
+        .filter(Pagamento.criado_em >= inicio, Pagamento.criado_em < fim)
+        .group_by(tipo)
+        .order_by(tipo)
+        .all()
+    )
+    recebido = sum((total for _, _, total in por_tipo), Decimal('0.00'))
+    return {
+        'pedidos': pedidos,
+        'vendido': vendido,
+        'recebido': recebido,
+        'pagamentos': por_tipo,
+        'diferenca': vendido - recebido,
+    }
+
+# ====== RESERVA DE ESTOQUE ======
+def _disponivel(estoque_ids):
+    return {
+        estoque_id: (nome, quantidade)
+        for estoque_id, nome, quantidade in session.query(EstoqueItem.id, EstoqueItem._nome, EstoqueItem._quantidade)
+        .filter(EstoqueItem.id.in_(estoque_ids))
+    }
+
+def _faltantes(necessidade, disponivel):
+    faltantes = {}
+    for estoque_id, solicitado in necessidade.items():
+        nome, em_estoque = disponivel[estoque_id]
+        if em_estoque < solicitado:
+            faltantes[nome] = (solicitado, em_estoque)
+    return faltantes
+
+def reservar_estoque(itens):
+    """Dá baixa no estoque de todas as linhas (ItemPedido) de um pedido de uma só vez.
+
+    As receitas dos produtos e o saldo dos ingredientes vêm de uma única
+    consulta (JOIN pelas chaves), todas as quantidades são conferidas antes
+    de alterar qualquer linha e a baixa é um único UPDATE condicional
+    (quantidade >= baixa), que o banco avalia de forma atômica. Produto sem
+    receita conta como fora de estoque.
+
+    Se outro terminal vendeu o mesmo ingrediente entre a conferência e o
+    UPDATE, menos linhas são afetadas e a exceção é levantada do mesmo jeito:
+    quem chama deve dar rollback, o que desfaz qualquer baixa parcial.
+    """
+    por_produto = Counter()
+    nomes = {}
+    for item in itens:
+        por_produto[item.produto.id] += item._quantidade
+        nomes[item.produto.id] = item.produto._nome
+    if not por_produto:
+        return
+
+    consumo = (
+        session.query(Receita.produto_id, Receita._quantidade, EstoqueItem.id, EstoqueItem._nome, EstoqueItem._quantidade)
+        .join(EstoqueItem, Receita.estoque_item_id == EstoqueItem.id)
+        .filter(Receita.produto_id.in_(por_produto))
+    )
+    necessidade = Counter()
+    disponivel = {}
+    com_receita = set()
+    for produto_id, por_unidade, estoque_id, nome, em_estoque in consumo:
+        necessidade[estoque_id] += por_unidade * por_produto[produto_id]
+        disponivel[estoque_id] = (nome, em_estoque)
+        com_receita.add(produto_id)
+
+    faltantes = {nomes[produto_id]: (quantidade, 0)
+                 for produto_id, quantidade in por_produto.items() if produto_id not in com_receita}
+    faltantes.update(_faltantes(necessidade, disponivel))
+    if faltantes:
+        raise EstoqueInsuficienteError(faltantes)
+
+    baixa = case(necessidade, value=EstoqueItem.id)
+    resultado = session.execute(
+        update(EstoqueItem)
+        .where(EstoqueItem.id.in_(necessidade), EstoqueItem._quantidade >= baixa)
+        .values({EstoqueItem._quantidade: EstoqueItem._quantidade - baixa}),
+        execution_options={'synchronize_session': 'fetch'},
+    )
+    if resultado.rowcount != len(necessidade):
+        disponivel = _disponivel(necessidade)
+        raise EstoqueInsuficienteError(_faltantes(necessidade, disponivel) or {
+            nome: (necessidade[estoque_id], em_estoque) for estoque_id, (nome, em_estoque) in disponivel.items()
+        })
+
+# ====== CACHE DO CARDÁPIO ======
+class CacheLeitura:
+    """Cache em memória com limite de tamanho (LRU) e validade (TTL), seguro entre threads"""
+
+    def __init__(self, tamanho_maximo=2048, ttl=300):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+
+    def consultar(self, chave):
+        """Retorna (encontrado, valor)"""
+        with self._trava:
+            entrada = self._itens.get(chave)
+            if entrada is not None and entrada[1] > time.monotonic():
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return True, entrada[0]
+            if entrada is not None:
+                del self._itens[chave]
+            self.falhas += 1
+            return False, None
+
+    def guardar(self, chave, valor):
+        with self._trava:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def obter(self, chave, carregar):
+        encontrado, valor = self.consultar(chave)
+        if not encontrado:
+            valor = carregar()
+            self.guardar(chave, valor)
+        return valor
+
+    def invalidar(self):
+        with self._trava:
+            self._itens.clear()
+            self.invalidacoes += 1
+
+    def estatisticas(self):
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                'itens': len(self._itens),
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+                'invalidacoes': self.invalidacoes,
+            }
+
+# Cardápio e preços de produtos. Alterações feitas por este processo invalidam
+# o cache no commit; as de outros terminais aparecem ao expirar o TTL.
+cache_cardapio = CacheLeitura(
+    tamanho_maximo=int(os.environ.get('RESTAURANTE_CACHE_TAMANHO', 2048)),
+    ttl=float(os.environ.get('RESTAURANTE_CACHE_TTL', 300)),
+)
+
+def _marcar_cache_cardapio(_mapper, _conexao, alvo):
+    sessao = object_session(alvo)
+    if sessao is not None:
+        sessao.info['invalidar_cache_cardapio'] = True
+
+for _modelo in (CardapioItem, Produto):
+    for _evento in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_modelo, _evento, _marcar_cache_cardapio)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_cache_cardapio(sessao):
+    if sessao.info.pop('invalidar_cache_cardapio', False):
+        cache_cardapio.invalidar()
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_marca_cache(sessao):
+    sessao.info.pop('invalidar_cache_cardapio', None)
+
+def cardapio_em_cache():
+    """Itens do cardápio (id, nome, valor) em ordem de nome, servidos da memória"""
+    def carregar():
+        with Session() as sessao:
+            return tuple(sessao.query(CardapioItem.id, CardapioItem._nome.label('nome'),
+                                      CardapioItem._valor.label('valor')).order_by(CardapioItem._nome))
+    return cache_cardapio.obter('cardapio', carregar)
+
+def produtos_em_cache(ids):
+    """Produtos por id, destacados de qualquer sessão; os que faltam no cache vêm numa só consulta"""
+    produtos = {}
+    faltando = []
+    for produto_id in ids:
+        encontrado, produto = cache_cardapio.consultar(('produto', produto_id))
+        if encontrado:
+            produtos[produto_id] = produto
+        else:
+            faltando.append(produto_id)
+    if faltando:
+        with Session() as sessao:
+            for produto in sessao.query(Produto).filter(Produto.id.in_(faltando)):
+                cache_cardapio.guardar(('produto', produto.id), produto)
+                produtos[produto.id] = produto
+    return produtos
+
+# ====== BUSCA ======
+ResultadoBusca = namedtuple('ResultadoBusca', 'id nome cpf')
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: 'José' e 'jose' viram a mesma palavra"""
+    if texto.isascii():
+        return texto.casefold()
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(letra for letra in decomposto if not unicodedata.combining(letra)).casefold()
+
+_PALAVRA = re.compile(r'\w+')
+
+@lru_cache(maxsize=65536)
+def _normalizar_palavra(palavra):
+    return normalizar(palavra)
+
+def _palavras(texto):
+    # nomes repetem muito as mesmas palavras; normalizar palavra a palavra aproveita o cache
+    return [_normalizar_palavra(palavra) for palavra in _PALAVRA.findall(texto or '')]
+
+def _cpf_invertido(cpf):
+    # só os dígitos, de trás para frente: o final do CPF vira prefixo
+    return re.sub(r'\D', '', cpf)[::-1]
+
+class IndiceNomes:
+    """Índice em memória de um cadastro para busca enquanto se digita.
+
+    Busca por prefixo das palavras do nome, sem acento e sem diferenciar
+    maiúsculas, por final do CPF e, quando uma palavra não casa com nada,
+    pelas palavras parecidas (erros de digitação). As palavras e os CPFs
+    invertidos ficam em listas ordenadas, e achar um prefixo é uma bisseção,
+    como descer numa trie.
+
+    As gravações deste processo entram no índice no commit; as de outros
+    terminais aparecem quando o TTL vence e o índice é recarregado numa
+    thread separada, enquanto as buscas seguem usando o índice anterior.
+    """
+
+    def __init__(self, carregar, ttl=300):
+        self._carregar = carregar  # função que devolve (id, nome, cpf) de todos os registros
+        self.ttl = ttl
+        self._trava = threading.Lock()
+        self._expira_em = 0.0
+        self._carregado = False
+        self._recarregando = False
+        self._registros = {}  # id: (nome, cpf, palavras)
+        self._palavras = []  # (palavra, id) em ordem
+        self._cpfs = []  # (cpf invertido, id) em ordem
+        self._vocabulario = Counter()
+
+    def invalidar(self):
+        with self._trava:
+            self._carregado = False
+
+    def _recarregar(self):
+        """Monta o índice a partir do banco fora da trava e troca tudo de uma vez"""
+        registros = {}
+        vocabulario = Counter()
+        for registro_id, nome, cpf in self._carregar():
+            palavras = tuple(set(_palavras(nome)))
+            registros[registro_id] = (nome, cpf, palavras)
+            vocabulario.update(palavras)
+        palavras = sorted((palavra, registro_id) for registro_id, (_, _, lista) in registros.items() for palavra in lista)
+        cpfs = sorted((_cpf_invertido(cpf), registro_id) for registro_id, (_, cpf, _) in registros.items() if cpf)
+        with self._trava:
+            self._registros, self._vocabulario, self._palavras, self._cpfs = registros, vocabulario, palavras, cpfs
+            self._expira_em = time.monotonic() + self.ttl
+            self._carregado = True
+            self._recarregando = False
+
+    def _garantir_atualizado(self):
+        """Primeira carga na hora; depois, recarga em segundo plano quando o TTL vence"""
+        if not self._carregado:
+            self._recarregar()
+            return
+        with self._trava:
+            if self._recarregando or time.monotonic() < self._expira_em:
+                return
+            self._recarregando = True
+        threading.Thread(target=self._recarregar, daemon=True).start()
+
+    def _remover(self, registro_id):
+        _, cpf, palavras = self._registros.pop(registro_id)
+        for palavra in palavras:
+            del self._palavras[bisect.bisect_left(self._palavras, (palavra, registro_id))]
+            self._vocabulario[palavra] -= 1
+            if not self._vocabulario[palavra]:
+                del self._vocabulario[palavra]
+        if cpf:
+            del self._cpfs[bisect.bisect_left(self._cpfs, (_cpf_invertido(cpf), registro_id))]
+
+    def aplicar(self, alteracoes):
+        """Aplica (id, nome, cpf) gravados; nome None indica registro removido"""
+        with self._trava:
+            if not self._carregado:
+                return  # será carregado inteiro na próxima busca
+            for registro_id, nome, cpf in alteracoes:
+                if registro_id in self._registros:
+                    self._remover(registro_id)
+                if nome is None:
+                    continue
+                palavras = tuple(set(_palavras(nome)))
+                self._registros[registro_id] = (nome, cpf, palavras)
+                self._vocabulario.update(palavras)
+                for palavra in palavras:
+                    bisect.insort(self._palavras, (palavra, registro_id))
+                if cpf:
+                    bisect.insort(self._cpfs, (_cpf_invertido(cpf), registro_id))
+
+    @staticmethod
+    def _com_prefixo(lista, prefixo):
+        inicio = bisect.bisect_left(lista, (prefixo,))
+        fim = bisect.bisect_left(lista, (prefixo + '\uffff',))
+        return inicio, fim
+
+    def _parecidas(self, palavra):
+        return difflib.get_close_matches(palavra, list(self._vocabulario), n=5, cutoff=0.75)
+
+    def buscar(self, texto, limite=10):
+        """Até `limite` registros cujo nome tem palavras começando com cada termo
+        do texto; se o texto for só dígitos (com ou sem pontuação), busca pelo
+        final do CPF"""
+        self._garantir_atualizado()
+        with self._trava:
+            digitos = re.sub(r'[.\-/\s]', '', texto)
+            if digitos.isdigit() and self._cpfs:
+                inicio, fim = self._com_prefixo(self._cpfs, digitos[::-1])
+                candidatos = (registro_id for _, registro_id in self._cpfs[inicio:fim])
+                termos = []
+            else:
+                # cada termo vira uma lista de prefixos aceitos: ele mesmo ou as palavras parecidas
+                termos = []
+                for termo in _palavras(texto):
+                    inicio, fim = self._com_prefixo(self._palavras, termo)
+                    termos.append([termo] if inicio < fim else self._parecidas(termo))
+                if not termos or not all(termos):
+                    return []
+                # percorre as palavras do termo mais raro e confere os demais em cada registro
+                faixas = [[self._com_prefixo(self._palavras, prefixo) for prefixo in prefixos] for prefixos in termos]
+                menor = min(range(len(termos)), key=lambda i: sum(fim - inicio for inicio, fim in faixas[i]))
+                candidatos = (registro_id for inicio, fim in faixas[menor] for _, registro_id in self._palavras[inicio:fim])
+
+            resultados = []
+            vistos = set()
+            for registro_id in candidatos:
+                if registro_id in vistos:
+                    continue
+                vistos.add(registro_id)
+                nome, cpf, palavras = self._registros[registro_id]
+                if all(any(palavra.startswith(prefixo) for prefixo in prefixos for palavra in palavras)
+                       for prefixos in termos):
+                    resultados.append(ResultadoBusca(registro_id, nome, cpf))
+                    if len(resultados) >= limite:
+                        break
+            return resultados
+
+def _carregador(modelo, coluna_cpf=None):
+    def carregar():
+        with obter_engine().connect() as conexao:
+            consulta = select(modelo.id, modelo._nome, coluna_cpf if coluna_cpf is not None else literal(None))
+            yield from conexao.execute(consulta.execution_options(yield_per=5000))
+    return carregar
+
+_TTL_BUSCA = float(os.environ.get('RESTAURANTE_BUSCA_TTL', 300))
+indices_busca = {
+    'clientes': IndiceNomes(_carregador(Cliente, Cliente._cpf), _TTL_BUSCA),
+    'cardapio': IndiceNomes(_carregador(CardapioItem), _TTL_BUSCA),
+    'estoque': IndiceNomes(_carregador(EstoqueItem), _TTL_BUSCA),
+}
+_ENTIDADE_BUSCA = {Cliente: 'clientes', CardapioItem: 'cardapio', EstoqueItem: 'estoque'}
+
+def buscar(entidade, texto, limite=10):
+    """Busca por nome (prefixo, sem acento, tolerante a erros) ou final do CPF nos clientes"""
+    return indices_busca[entidade].buscar(texto, limite)
+
+def _anotar_busca(gravado):
+    def anotar(_mapper, _conexao, alvo):
+        sessao = object_session(alvo)
+        if sessao is not None:
+            sessao.info.setdefault('alteracoes_busca', []).append(
+                (_ENTIDADE_BUSCA[type(alvo)], alvo.id, alvo._nome if gravado else None, getattr(alvo, '_cpf', None))
+            )
+    return anotar
+
+for _modelo in _ENTIDADE_BUSCA:
+    event.listen(_modelo, 'after_insert', _anotar_busca(True))
+    event.listen(_modelo, 'after_update', _anotar_busca(True))
+    event.listen(_modelo, 'after_delete', _anotar_busca(False))
+
+@event.listens_for(Session, 'after_commit')
+def _atualizar_indices_busca(sessao):
+    alteracoes = sessao.info.pop('alteracoes_busca', None)
+    if alteracoes:
+        por_entidade = {}
+        for entidade, *alteracao in alteracoes:
+            por_entidade.setdefault(entidade, []).append(alteracao)
+        for entidade, lista in por_entidade.items():
+            indices_busca[entidade].aplicar(lista)
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alteracoes_busca(sessao):
+    sessao.info.pop('alteracoes_busca', None)
+
+# ====== SERVIÇOS ======
+# Operações do domínio sem input()/print: usadas pelos menus, pelo servidor
+# HTTP (servidor.py) e por qualquer outro cliente. Cada função confirma a sua
+# própria transação; quem chama descarta a sessão com session.remove().
+
+TENTATIVAS_CONFLITO = 5
+
+def _conflito_transitorio(erro):
+    """Banco ocupado (SQLite) ou falha de serialização/deadlock (PostgreSQL)"""
+    if getattr(erro.orig, 'pgcode', None) in ('40001', '40P01'):
+        return True
+    mensagem = str(erro.orig).lower()
+    return 'database is locked' in mensagem or 'database is busy' in mensagem
+
+def repetir_em_conflito(funcao):
+    """Refaz a operação inteira, com espera crescente, quando a transação
+    perde a disputa com outro terminal. Só serve para serviços que abrem e
+    confirmam a própria transação."""
+    @wraps(funcao)
+    def executar(*args, **kwargs):
+        for tentativa in range(1, TENTATIVAS_CONFLITO + 1):
+            try:
+                return funcao(*args, **kwargs)
+            except OperationalError as erro:
+                session.rollback()
+                if tentativa == TENTATIVAS_CONFLITO or not _conflito_transitorio(erro):
+                    raise
+                time.sleep(0.01 * 2 ** tentativa * (0.5 + random.random()))
+    return executar
+
+def _confirmar(mensagem_duplicado):
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise RegistroDuplicadoError(mensagem_duplicado)
+
+def _obter(modelo, registro_id):
+    registro = session.get(modelo, registro_id)
+    if registro is None:
+        raise RegistroNaoEncontradoError(f"{modelo.__name__} {registro_id} não encontrado.")
+    return registro
+
+def buscar_cliente_por_cpf(cpf):
+    cliente = session.query(Cliente).filter_by(_cpf=cpf).first()
+    if cliente is None:
+        raise RegistroNaoEncontradoError(f"Cliente com CPF {cpf} não encontrado.")
+    return cliente
+
+def cadastrar_cliente(nome, cpf, idade, data_nascimento):
+    cliente = Cliente(nome, cpf, idade, data_nascimento)
+    session.add(cliente)
+    _confirmar(f"Já existe um cliente com o CPF {cpf}.")
+    return cliente
+
+def _carregar_itens(itens):
+    """Converte pares (produto_id, quantidade) em pares (Produto, quantidade).
+
+    Os produtos e preços vêm do cache e são anexados à sessão com
+    merge(load=False), que não faz SELECT.
+    """
+    itens = [(int(produto_id), int(quantidade)) for produto_id, quantidade in itens]
+    ids = {produto_id for produto_id, _ in itens}
+    produtos = produtos_em_cache(ids)
+    faltando = ids - produtos.keys()
+    if faltando:
+        raise RegistroNaoEncontradoError(f"Produto(s) não encontrado(s): {sorted(faltando)}.")
+    anexados = {produto_id: session.merge(produto, load=False) for produto_id, produto in produtos.items()}
+    return [(anexados[produto_id], quantidade) for produto_id, quantidade in itens]
+
+@repetir_em_conflito
+def reservar_produtos(itens):
+    """Dá baixa no estoque de pares (produto_id, quantidade) sem abrir pedido"""
+    linhas = Pedido._agrupar_itens(_carregar_itens(itens))
+    try:
+        reservar_estoque(linhas)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return {linha.produto._nome: linha._quantidade for linha in linhas}
+
+@repetir_em_conflito
+def criar_pedido(cliente_id, itens):
+    """Abre um pedido para o cliente a partir de pares (produto_id, quantidade)"""
+    if not itens:
+        raise ValueError("O pedido precisa de pelo menos um item.")
+    cliente = _obter(Cliente, cliente_id)
+    try:
+        pedido = Pedido(cliente, _carregar_itens(itens))
+        session.add(pedido)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return pedido
+
+def _novo_pagamento(cliente_id, tipo, valor):
+    pagamento = Pagamento(tipo=tipo, valor=valor, cliente=_obter(Cliente, cliente_id))
+    session.add(pagamento)
+    return pagamento
+
+def efetuar_pagamento(cliente_id, tipo, valor, esperar=True):
+    valor = para_dinheiro(valor)
+    if valor <= 0:
+        raise ValueError("O valor do pagamento deve ser maior que zero.")
+    return gravar(_novo_pagamento, cliente_id, tipo, valor, esperar=esperar,
+                  descricao=f"pagamento de R${valor:.2f} do cliente {cliente_id}")
+
+def _novo_item_estoque(nome, quantidade, valor):
+    item = EstoqueItem(nome=nome, quantidade=quantidade, valor=valor)
+    session.add(item)
+    return item
+
+def _alterar_item_estoque(item_id, nome=None, quantidade=None, valor=None):
+    item = _obter(EstoqueItem, item_id)
+    if nome:
+        item.nome = nome
+    if quantidade is not None:
+        item.quantidade = quantidade
+    if valor is not None:
+        item.valor = valor
+    return item
+
+def _remover_item_estoque(item_id):
+    session.delete(_obter(EstoqueItem, item_id))
+
+def cadastrar_item_estoque(nome, quantidade, valor, esperar=True):
+    return gravar(_novo_item_estoque, nome, quantidade, valor, esperar=esperar,
+                  descricao=f"inclusão de '{nome}' no estoque")
+
+def alterar_item_estoque(item_id, nome=None, quantidade=None, valor=None, esperar=True):
+    return gravar(_alterar_item_estoque, item_id, nome, quantidade, valor, esperar=esperar,
+                  descricao=f"alteração do item {item_id} do estoque")
+
+def remover_item_estoque(item_id, esperar=True):
+    return gravar(_remover_item_estoque, item_id, esperar=esperar,
+                  descricao=f"remoção do item {item_id} do estoque")
+
+# ====== GRAVAÇÃO EM LOTE (GROUP COMMIT) ======
+# Desligada, cada escrita confirma a própria transação na hora. Ligada (com
+# RESTAURANTE_GRAVACAO_EM_LOTE=1), as escritas vão para uma fila e uma thread
+# gravadora confirma numa única transação até RESTAURANTE_LOTE_OPERACOES
+# delas: as que já estão na fila mais as que chegarem em
+# RESTAURANTE_LOTE_JANELA_MS. Um fsync por lote em vez de um por operação.
+# Quem espera o resultado só volta depois do commit; quem não espera (os
+# menus) pode perder a janela em andamento se o processo cair.
+
+@repetir_em_conflito
+def gravar_agora(operacao, *args):
+    """Roda a operação de escrita e confirma a transação"""
+    try:
+        resultado = operacao(*args)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return resultado
+
+class GravacaoEmLote:
+    """Thread gravadora que junta várias operações de escrita num commit.
+
+    As operações usam a `session` da thread gravadora e não confirmam a
+    transação. Se o lote falhar, cada operação é refeita sozinha, na sua
+    própria transação, para que só a culpada receba o erro.
+    """
+
+    def __init__(self, max_operacoes=100, janela_ms=2):
+        self.max_operacoes = max_operacoes
+        self.janela_ms = janela_ms
+        self.falhas = deque(maxlen=100)  # (descrição, erro) das gravações que ninguém esperou
+        self.lotes = 0
+        self.operacoes = 0
+        self._fila = None
+        self._thread = None
+        self._trava = threading.Lock()
+
+    @property
+    def ativa(self):
+        return self._thread is not None
+
+    def ativar(self):
+        with self._trava:
+            if self._thread is not None:
+                return
+            self._fila = queue.Queue()
+            self._thread = threading.Thread(target=self._gravar, args=(self._fila,), name='gravacao-em-lote', daemon=True)
+            self._thread.start()
+
+    def desativar(self):
+        """Grava o que ainda está na fila e encerra a thread gravadora"""
+        with self._trava:
+            fila, thread = self._fila, self._thread
+            self._fila = self._thread = None
+            if thread is not None:
+                fila.put(None)  # ainda sob a trava: nada entra na fila depois do aviso de fim
+        if thread is not None:
+            thread.join()
+
+    def enviar(self, operacao, *args):
+        """Põe a operação na fila; o Future recebe o resultado depois do commit"""
+        futuro = Future()
+        with self._trava:
+            if self._fila is None:
+                raise RuntimeError('A gravação em lote está desligada.')
+            self._fila.put((operacao, args, futuro))
+        return futuro
+
+    def descarregar(self):
+        """Espera até que tudo o que já foi enviado esteja gravado"""
+        fila = self._fila
+        if fila is not None:
+            fila.join()
+
+    def _proximo_lote(self, fila):
+        """Bloqueia até a primeira operação e junta as que já estão na fila
+        ou chegarem dentro da janela.
+
+        Devolve (lote, fim); fim indica que desativar() pediu o encerramento.
+        """
+        item = fila.get()
+        if item is None:
+            return [], True
+        lote = [item]
+        prazo = time.monotonic() + self.janela_ms / 1000
+        while len(lote) < self.max_operacoes:
+            try:
+                item = fila.get_nowait()
+            except queue.Empty:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+            if item is None:
+                return lote, True
+            lote.append(item)
+        return lote, False
+
+    def _gravar(self, fila):
+        fim = False
+        while not fim:
+            lote, fim = self._proximo_lote(fila)
+            try:
+                if lote:
+                    with instrumentacao.operacao('gravação em lote'):
+                        self._confirmar(lote)
+            except Exception as erro:
+                # a thread não pode morrer: quem espera um Future ou um
+                # descarregar() ficaria parado para sempre
+                for _, _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(erro)
+            finally:
+                for _ in range(len(lote) + fim):
+                    fila.task_done()
+
+    def _confirmar(self, lote):
+        # expire_on_commit=False: quem recebe o resultado lê os atributos já
+        # carregados, sem consultar de novo numa sessão que é de outra thread
+        session.registry.set(Session(expire_on_commit=False))
+        self.lotes += 1
+        self.operacoes += len(lote)
+        try:
+            try:
+                resultados = [operacao(*args) for operacao, args, _ in lote]
+                session.commit()
+            except Exception:
+                session.rollback()
+                for operacao, args, futuro in lote:
+                    try:
+                        futuro.set_result(gravar_agora(operacao, *args))
+                    except Exception as erro:
+                        futuro.set_exception(erro)
+            else:
+                for (_, _, futuro), resultado in zip(lote, resultados):
+                    futuro.set_result(resultado)
+        finally:
+            session.remove()
+
+    def estatisticas(self):
+        return {
+            'ativa': self.ativa,
+            'lotes': self.lotes,
+            'operacoes': self.operacoes,
+            'media_por_lote': round(self.operacoes / self.lotes, 1) if self.lotes else 0,
+            'falhas': len(self.falhas),
+        }
+
+gravacao_em_lote = GravacaoEmLote(
+    max_operacoes=int(os.environ.get('RESTAURANTE_LOTE_OPERACOES', 100)),
+    janela_ms=float(os.environ.get('RESTAURANTE_LOTE_JANELA_MS', 2)),
+)
+
+def gravar(operacao, *args, esperar=True, descricao=None):
+    """Executa uma operação de escrita que não confirma a transação.
+
+    Com a gravação em lote desligada roda e confirma na hora. Ligada, entra
+    na fila: esperar=True devolve o resultado depois do commit do lote e
+    esperar=False volta na hora (os erros ficam em gravacao_em_lote.falhas).
+    """
+    if not gravacao_em_lote.ativa:
+        return gravar_agora(operacao, *args)
+    futuro = gravacao_em_lote.enviar(operacao, *args)
+    if esperar:
+        return futuro.result()
+
+    def registrar_falha(futuro):
+        if futuro.exception() is not None:
+            gravacao_em_lote.falhas.append((descricao or operacao.__name__, futuro.exception()))
+    futuro.add_done_callback(registrar_falha)
+    return None
+
+def exibir_falhas_gravacao():
+    """Avisa no terminal das gravações em lote que falharam depois de enviadas"""
+    gravacao_em_lote.descarregar()  # poucos milissegundos: o lote em andamento
+    while gravacao_em_lote.falhas:
+        descricao, erro = gravacao_em_lote.falhas.popleft()
+        print(f"⚠ Não foi possível gravar {descricao}: {getattr(erro, 'orig', None) or erro}")
+
+def informar_gravacao(mensagem_sucesso):
+    """Mensagem após uma escrita enviada sem esperar; em lote ela só foi enfileirada"""
+    if gravacao_em_lote.ativa:
+        print("Enviado para gravação em lote; se falhar, o aviso aparece na próxima tela.")
+    else:
+        print(mensagem_sucesso)
 
 # ====== FUNÇÕES UTILITÁRIAS ======
 def exibir_nome_programa():
@@ -334,11 +1858,9 @@ def exibir_nome_programa():
 def limpar_tela():
     os.system('cls' if os.name == 'nt' else 'clear') #Para compatibilidade universal
 
-def volta_menu():
-    menu_gerenciamento()
-
 def exibir_titulo(titulo):
     limpar_tela()
+    exibir_falhas_gravacao()
     print('*' * len(titulo))
     print(titulo)
     print('*' * len(titulo))
@@ -351,73 +1873,245 @@ def obter_data_formatada(mensagem='Data de Nascimento (DD/MM/AAAA): '):
         except ValueError:
             print('Formato inválido! Use DD/MM/AAAA.')
 
+def obter_data_opcional(mensagem, padrao):
+    """Lê uma data DD/MM/AAAA; Enter vazio retorna o padrão"""
+    while True:
+        entrada = input(mensagem).strip()
+        if not entrada:
+            return padrao
+        try:
+            return datetime.strptime(entrada, '%d/%m/%Y').date()
+        except ValueError:
+            print('Formato inválido! Use DD/MM/AAAA.')
+
+def obter_periodo(dias_padrao=7):
+    """Lê início e fim de um período; por padrão, os últimos dias_padrao dias"""
+    hoje = date.today()
+    inicio = obter_data_opcional(f"Data inicial (Enter para {hoje - timedelta(days=dias_padrao - 1):%d/%m/%Y}): ",
+                                 hoje - timedelta(days=dias_padrao - 1))
+    fim = obter_data_opcional(f"Data final (Enter para {hoje:%d/%m/%Y}): ", hoje)
+    return inicio, fim
+
+def obter_numero_opcional(mensagem, tipo=float):
+    """Lê um número; Enter vazio retorna None"""
+    while True:
+        entrada = input(mensagem).strip()
+        if not entrada:
+            return None
+        try:
+            return tipo(entrada)
+        except ValueError:
+            print('Número inválido! Tente novamente ou tecle Enter para ignorar.')
+
+def escolher_registro(entidade, mensagem):
+    """Lê um nome (ou CPF, para clientes) e devolve o id escolhido.
+
+    Só é escolhido direto o registro cujo nome ou CPF bate exatamente com o
+    texto; resultados por prefixo ou aproximados são sempre listados para o
+    usuário escolher pelo número. O registro escolhido é exibido.
+    """
+    texto = input(mensagem).strip()
+    if not texto:
+        return None
+    gravacao_em_lote.descarregar()  # o que acabou de ser enviado já aparece na busca
+    resultados = buscar(entidade, texto, limite=10)
+    exatos = [r for r in resultados if normalizar(r.nome) == normalizar(texto) or r.cpf == texto]
+    if len(exatos) == 1:
+        escolhido = exatos[0]
+    elif not resultados:
+        return None
+    else:
+        print("\nEncontrados:")
+        for numero, resultado in enumerate(resultados, start=1):
+            print(f"{numero}. {_descrever_resultado(resultado)}")
+        escolha = input("Número (Enter cancela): ").strip()
+        if not (escolha.isdigit() and 1 <= int(escolha) <= len(resultados)):
+            return None
+        escolhido = resultados[int(escolha) - 1]
+    print(f"Selecionado: {_descrever_resultado(escolhido)}")
+    return escolhido.id
+
+def _descrever_resultado(resultado):
+    return resultado.nome + (f" (CPF {resultado.cpf})" if resultado.cpf else "")
+
+def confirmar(mensagem):
+    """Pergunta s/n; qualquer coisa diferente de 's' cancela"""
+    return input(f"{mensagem} (s/n): ").strip().lower() in ('s', 'sim')
+
+# ====== LISTAGEM PAGINADA ======
+def pagina_keyset(consulta, ordem, chave, apos=None, tamanho=20, decrescente=False):
+    """Gera as linhas da página que começa depois do cursor `apos`.
+
+    A ordenação é sempre (ordem, chave), com a chave primária desempatando,
+    e o cursor é o par (ordem, chave) da última linha da página anterior.
+    Assim cada página é uma busca por índice, sem OFFSET, e as linhas são
+    lidas do banco em streaming. Valores NULL em `ordem` vêm antes de todos
+    (depois de todos na ordem decrescente), com a chave desempatando. O valor
+    do cursor é ligado com o tipo da coluna (reais viram centavos, por exemplo).
+    """
+    if apos is not None:
+        valor, ultima_chave = apos
+        if decrescente:
+            if valor is None:
+                depois = and_(ordem.is_(None), chave < ultima_chave)
+            else:
+                depois = or_(tuple_(ordem, chave) < tuple_(literal(valor, ordem.type), ultima_chave), ordem.is_(None))
+        elif valor is None:
+            depois = or_(and_(ordem.is_(None), chave > ultima_chave), ordem.isnot(None))
+        else:
+            depois = tuple_(ordem, chave) > tuple_(literal(valor, ordem.type), ultima_chave)
+        consulta = consulta.filter(depois)
+    if decrescente:
+        consulta = consulta.order_by(ordem.desc().nulls_last(), chave.desc())
+    else:
+        consulta = consulta.order_by(ordem.asc().nulls_first(), chave)
+    return consulta.limit(tamanho).yield_per(tamanho)
+
+def exibir_listagem(titulo, modelo, cabecalho, formatar, ordenacoes, busca=None, tamanho_pagina=20):
+    """Tela de listagem paginada com navegação, ordenação e busca.
+
+    ordenacoes: lista de pares (rótulo, coluna); a primeira é a ordem padrão.
+    busca: coluna usada no filtro por trecho de texto.
+    """
+    rotulo, ordem = ordenacoes[0]
+    decrescente = False
+    termo = None
+    cursores = [None]  # cursor de início de cada página já visitada
+    gravacao_em_lote.descarregar()
+
+    while True:
+        limpar_tela()
+        exibir_titulo(titulo)
+        consulta = session.query(modelo)
+        if termo:
+            consulta = consulta.filter(busca.ilike(f'%{termo}%'))
+
+        print(f"\n{cabecalho}")
+        print("-" * len(cabecalho))
+        exibidas = 0
+        ultima = None
+        tem_proxima = False
+        with instrumentacao.operacao(f'listagem de {modelo.__tablename__}'):
+            for registro in pagina_keyset(consulta, ordem, modelo.id, cursores[-1], tamanho_pagina + 1, decrescente):
+                if exibidas == tamanho_pagina:
+                    tem_proxima = True
+                    break
+                print(formatar(registro))
+                exibidas += 1
+                ultima = registro
+        if not exibidas:
+            print("Nenhum registro encontrado.")
+        print("-" * len(cabecalho))
+
+        filtro = f" | busca: '{termo}'" if termo else ""
+        print(f"Página {len(cursores)} | ordem: {rotulo}{' (decrescente)' if decrescente else ''}{filtro}")
+        opcoes = []
+        if tem_proxima:
+            opcoes.append("[P] Próxima")
+        if len(cursores) > 1:
+            opcoes.append("[A] Anterior")
+        opcoes.append("[O] Ordenar")
+        if busca is not None:
+            opcoes.append("[B] Buscar")
+        opcoes.append("[V] Voltar")
+        comando = input("  ".join(opcoes) + "\nEscolha: ").strip().upper()
+
+        if comando == 'P' and tem_proxima:
+            cursores.append((getattr(ultima, ordem.key), ultima.id))
+        elif comando == 'A' and len(cursores) > 1:
+            cursores.pop()
+        elif comando == 'O':
+            for numero, (nome_ordem, _) in enumerate(ordenacoes, start=1):
+                print(f"{numero}. {nome_ordem}")
+            try:
+                rotulo, ordem = ordenacoes[int(input("Ordenar por: ")) - 1]
+            except (ValueError, IndexError):
+                continue
+            decrescente = input("Decrescente? (S/N): ").strip().upper() == 'S'
+            cursores = [None]
+        elif comando == 'B' and busca is not None:
+            termo = input("Buscar (Enter limpa a busca): ").strip() or None
+            cursores = [None]
+        elif comando == 'V':
+            return
+
 # ====== LOGIN ======
 def sistema_login():
-    limpar_tela()
-    exibir_nome_programa()
-    print("******************")
-    print("LOGIN DO SISTEMA")
-    print("******************\n")
+    while True:
+        limpar_tela()
+        exibir_nome_programa()
+        print("******************")
+        print("LOGIN DO SISTEMA")
+        print("******************\n")
 
-    usuario = input('Login: ').strip()
-    senha = input('Senha: ').strip()
+        usuario = input('Login: ').strip()
+        senha = input('Senha: ').strip()
 
-    try:
         if usuario.upper() == "ADMIN" and senha.upper() == "ADMIN":
             menu_gerenciamento()
-        else:
-            print('\nLogin inválido. Tente novamente.\n')
-            input('Pressione Enter para continuar...')
-            sistema_login()
-    except ValueError:
-            sistema_login()
+            return
+        print('\nLogin inválido. Tente novamente.\n')
+        input('Pressione Enter para continuar...')
 
 # ====== MENU GERAL ======
 def menu_gerenciamento():
+    """Laço principal de navegação.
+
+    Cada submenu é despachado pela tabela de opções e retorna para cá ao
+    terminar, em vez de chamar o menu de novo; assim a pilha de chamadas
+    tem profundidade fixa por mais longo que seja o expediente.
+    """
+    opcoes = {
+        1: ('FUNCIONÁRIO', menu_funcionario),
+        2: ('CLIENTE', menu_cliente),
+        3: ('CARDÁPIO', menu_cardapio),
+        4: ('ESTOQUE_PRODUTO', menu_estoque),
+        5: ('PAGAMENTO', visualizar_pagamentos),
+        6: ('RELATÓRIOS', menu_relatorios),
+        7: ('DIAGNÓSTICO', menu_diagnostico),
+        8: ('SAIR', sair),
+    }
+
     limpar_tela()
     exibir_nome_programa()
 
     while True:
+        exibir_falhas_gravacao()
         print("****************")
         print("GERENCIAMENTO")
         print("****************\n")
 
-        print('1. FUNCIONÁRIO')
-        print('2. CLIENTE')
-        print('3. CARDÁPIO')
-        print('4. ESTOQUE_PRODUTO')
-        print('5. PAGAMENTO')
-        print('6. RELATÓRIOS')
-        print('7. SAIR')
+        for numero, (rotulo, _) in opcoes.items():
+            print(f'{numero}. {rotulo}')
 
         try:
             opcao = int(input('Escolha uma opção: '))
-            if opcao == 1:
-                menu_funcionario()
-            elif opcao == 2:
-                menu_cliente()
-            elif opcao == 3:
-                menu_cardapio()
-            elif opcao == 4:           
-                menu_estoque()
-            elif opcao == 5:
-                visualizar_pagamentos()
-            elif opcao == 6:
-                menu_relatorios()
-            elif opcao == 7:
-                sair()
-            else:
-                limpar_tela()
-                print('Opção inválida! Digite um número de 1 a 7.')
-                volta_menu()
         except ValueError:
             limpar_tela()
             print('Entrada inválida! Digite um número inteiro.')
-            volta_menu()
+            continue
+        if opcao not in opcoes:
+            limpar_tela()
+            print(f'Opção inválida! Digite um número de 1 a {len(opcoes)}.')
+            continue
+
+        try:
+            opcoes[opcao][1]()
+        except ValueError:
+            session.rollback()
+            limpar_tela()
+            print('Entrada inválida! Operação cancelada.')
+            continue
+        finally:
+            session.remove()
+
+        limpar_tela()
+        exibir_nome_programa()
 
 # ====== MENU FUNCIONÁRIO ======
 def menu_funcionario():
     while True:
+        session.remove()
         exibir_titulo("OPÇÕES FUNCIONÁRIO")
         print("1. Adicionar Funcionário")
         print("2. Alterar Funcionário")
@@ -431,7 +2125,7 @@ def menu_funcionario():
             idade = int(input("Idade: "))
             data = obter_data_formatada()
             cargo = input("Cargo: ")
-            salario = float(input("Salário: "))
+            salario = para_dinheiro(input("Salário: "))
             funcionario = Funcionario(nome, cpf, idade, data, cargo, salario)
             try:
                 session.add(funcionario)
@@ -442,13 +2136,13 @@ def menu_funcionario():
                 print("Erro: Já existe um funcionário com esse CPF.")
         elif opcao == "2":
             cpf = input("Digite o CPF do funcionário: ")
-            funcionario = session.query(Funcionario).filter_by(cpf=cpf).first()
+            funcionario = session.query(Funcionario).filter_by(_cpf=cpf).first()
             if funcionario:
                 funcionario.nome = input(f"Novo nome ({funcionario.nome}): ") or funcionario.nome
                 funcionario.cargo = input(f"Novo cargo ({funcionario.cargo}): ") or funcionario.cargo
                 salario_input = input(f"Novo salário ({funcionario.salario}): ")
                 if salario_input:
-                    funcionario.salario = float(salario_input)
+                    funcionario.salario = para_dinheiro(salario_input)
                 session.commit()
                 print("Funcionário alterado com sucesso!")
             else:
@@ -463,28 +2157,23 @@ def menu_funcionario():
             else:
                 print("Funcionário não encontrado.")
         elif opcao == "4":
-            limpar_tela()
-            funcionarios = session.query(Funcionario).all()
-            if not funcionarios:
-                print("\nNenhum funcionário cadastrado.\n")
-            else:
-                print("\n--- LISTA DE FUNCIONÁRIOS ---\n")
-                print(f"{'Nome':<25} {'CPF':<15} {'Idade':<7} {'Data Nasc.':<15} {'Cargo':<20} {'Salário':<10}")
-                print("-" * 95)
-                for f in funcionarios:
-                    print(f"{f.nome:<25} {f.cpf:<15} {f.idade:<7} {f.data_nascimento.strftime('%d/%m/%Y'):<15} {f.cargo:<20} R${f.salario:<9.2f}")
-                print("-" * 95)
-            input("\nPressione Enter para continuar...")
+            exibir_listagem(
+                "LISTA DE FUNCIONÁRIOS", Funcionario,
+                f"{'Nome':<25} {'CPF':<15} {'Idade':<7} {'Data Nasc.':<15} {'Cargo':<20} {'Salário':<10}",
+                lambda f: f"{f.nome:<25} {f.cpf:<15} {f.idade:<7} {f.data_nascimento.strftime('%d/%m/%Y') if f.data_nascimento else '-':<15} {f.cargo:<20} R${f.salario:<9.2f}",
+                [("Nome", Funcionario._nome), ("Cargo", Funcionario._cargo), ("Salário", Funcionario._salario)],
+                busca=Funcionario._nome,
+            )
         elif opcao == "5":
-            volta_menu()
+            return
         else:
             print("Opção inválida.")
             input("\nPressione Enter para continuar...")
-            menu_funcionario()
 
 # ====== MENU CLIENTE ======
 def menu_cliente():
     while True:
+        session.remove()
         exibir_titulo('OPÇÕES CLIENTE')
         print('1. Adicionar Cliente')
         print('2. Alterar Cliente')
@@ -498,61 +2187,61 @@ def menu_cliente():
             cpf = input('CPF: ')
             idade = int(input('Idade: '))
             data = obter_data_formatada()
-            cliente = Cliente(nome, cpf, idade, data)
             try:
-                session.add(cliente)
-                session.commit()
+                with instrumentacao.operacao('cadastrar cliente'):
+                    cadastrar_cliente(nome, cpf, idade, data)
                 print('Cliente adicionado com sucesso!')
-            except IntegrityError:
-                session.rollback()
+            except RegistroDuplicadoError:
                 print("Erro: Já existe um cliente com esse CPF.")
         elif opcao == '2':
-            cpf = input('CPF do cliente: ')
-            cliente = session.query(Cliente).filter_by(cpf=cpf).first()
+            cliente_id = escolher_registro('clientes', 'Nome ou CPF do cliente: ')
+            cliente = session.get(Cliente, cliente_id) if cliente_id else None
             if cliente:
                 cliente.nome = input(f'Novo nome ({cliente.nome}): ') or cliente.nome
-                idade_input = input(f'Nova idade ({cliente.idade}): ')
-                if idade_input:
-                    cliente.idade = int(idade_input)
-                cliente.data_nascimento = input(f'Nova data de nascimento ({cliente.data_nascimento}): ') or cliente.data_nascimento
+                atual = f'{cliente.data_nascimento:%d/%m/%Y}' if cliente.data_nascimento else 'não informada'
+                cliente.data_nascimento = obter_data_opcional(
+                    f'Nova data de nascimento DD/MM/AAAA ({atual}): ', cliente.data_nascimento)
+                if cliente.data_nascimento:
+                    print(f'Idade: {cliente.idade} (calculada pela data de nascimento)')
+                else:
+                    idade_input = input(f'Nova idade ({cliente.idade}): ')
+                    if idade_input:
+                        cliente.idade = int(idade_input)
                 session.commit()
                 print('Cliente alterado com sucesso!')
             else:
                 print('Cliente não encontrado.')
         elif opcao == '3':
-            cpf = input('CPF do cliente a remover: ')
-            cliente = session.query(Cliente).filter_by(cpf=cpf).first()
-            if cliente:
+            cliente_id = escolher_registro('clientes', 'Nome ou CPF do cliente a remover: ')
+            cliente = session.get(Cliente, cliente_id) if cliente_id else None
+            if cliente and not confirmar(f"Remover o cliente {cliente.nome} (CPF {cliente.cpf})?"):
+                print('Remoção cancelada.')
+            elif cliente:
                 session.delete(cliente)
                 session.commit()
                 print('Cliente removido com sucesso!')
             else:
                 print('Cliente não encontrado.')
         elif opcao == '4':
-            limpar_tela()
-            clientes = session.query(Cliente).all()
-            if not clientes:
-                print('\nNenhum cliente cadastrado.\n')
-            else:
-                print("\n--- LISTA DE CLIENTES ---\n")
-                print(f"{'Nome':<25} {'CPF':<15} {'Idade':<7} {'Data Nasc.':<15}")
-                print("-" * 65)
-                for c in clientes:
-                    print(f"{c.nome:<25} {c.cpf:<15} {c.idade:<7} {c.data_nascimento.strftime('%d/%m/%Y'):<15}")
-                print("-" * 65)
-            input("\nPressione Enter para continuar...")
+            exibir_listagem(
+                "LISTA DE CLIENTES", Cliente,
+                f"{'Nome':<25} {'CPF':<15} {'Idade':<7} {'Data Nasc.':<15}",
+                lambda c: f"{c.nome:<25} {c.cpf:<15} {c.idade:<7} {c.data_nascimento.strftime('%d/%m/%Y') if c.data_nascimento else '-':<15}",
+                [("Nome", Cliente._nome), ("Nascimento", Cliente._data_nascimento), ("Cadastro", Cliente.id)],
+                busca=Cliente._nome,
+            )
         elif opcao == "5":
             registrar_pagamento()
         elif opcao == '6':
-            volta_menu()
+            return
         else:
             print('Opção inválida.')
             input("\nPressione Enter para continuar...")
-            menu_cliente()
 
 # ====== MENU CARDÁPIO ======
 def menu_cardapio():
     while True:
+        session.remove()
         exibir_titulo('OPÇÕES DO CARDÁPIO')
         print('1. Adicionar Produto')
         print('2. Alterar Produto')
@@ -567,23 +2256,22 @@ def menu_cardapio():
                 print("Nome não pode ser vazio.")
                 continue
             try:
-                valor = float(input('Valor: '))
+                valor = para_dinheiro(input('Valor: '))
                 if valor <= 0:
                     print("O valor deve ser maior que zero.")
                     continue
-                produto_existente = session.query(CardapioItem).filter_by(nome=nome).first()
-                if produto_existente:
-                    print("Já existe um produto com esse nome.")
-                    continue
                 novo_item = CardapioItem(nome=nome, valor=valor)
                 session.add(novo_item)
                 session.commit()
                 print("Produto adicionado com sucesso!")
             except ValueError:
                 print("Valor inválido. Digite um número válido.")
+            except IntegrityError:
+                session.rollback()
+                print("Já existe um produto com esse nome.")
         elif opcao == '2':
-            nome = input('Nome do Produto a alterar: ').strip()
-            produto = session.query(CardapioItem).filter_by(nome=nome).first()
+            item_id = escolher_registro('cardapio', 'Nome do Produto a alterar: ')
+            produto = session.get(CardapioItem, item_id) if item_id else None
             if produto:
                 novo_nome = input(f'Novo nome ({produto.nome}): ').strip()
                 if novo_nome:
@@ -591,45 +2279,46 @@ def menu_cardapio():
                 novo_valor = input(f'Novo valor (R${produto.valor:.2f}): ').strip()
                 if novo_valor:
                     try:
-                        produto.valor = float(novo_valor)
+                        produto.valor = para_dinheiro(novo_valor)
                     except ValueError:
                         print("Valor inválido. Alteração de valor ignorada.")
-                session.commit()
-                print("Produto alterado com sucesso!")
+                try:
+                    session.commit()
+                    print("Produto alterado com sucesso!")
+                except IntegrityError:
+                    session.rollback()
+                    print("Já existe um produto com esse nome.")
             else:
                 print("Produto não encontrado.")
         elif opcao == '3':
-            nome = input('Nome do Produto a remover: ').strip()
-            produto = session.query(CardapioItem).filter_by(_nome=nome).first()
-            if produto:
+            item_id = escolher_registro('cardapio', 'Nome do Produto a remover: ')
+            produto = session.get(CardapioItem, item_id) if item_id else None
+            if produto and not confirmar(f"Remover '{produto.nome}' do cardápio?"):
+                print("Remoção cancelada.")
+            elif produto:
                 session.delete(produto)
                 session.commit()
                 print("Produto removido com sucesso!")
             else:
                 print("Produto não encontrado.")
         elif opcao == '4':
-            limpar_tela()
-            itens = session.query(CardapioItem).all()
-            if not itens:
-                print("\nNenhum produto no cardápio.\n")
-            else:
-                print("\n--- CARDÁPIO ---\n")
-                print(f"{'Nome do Produto':<30} {'Valor':<10}")
-                print("-" * 40)
-                for item in itens:
-                    print(f'{item.nome:<30} R${item.valor:<9.2f}')
-                print("-" * 40)
-            input("\nPressione Enter para continuar...")
+            exibir_listagem(
+                "CARDÁPIO", CardapioItem,
+                f"{'Nome do Produto':<30} {'Valor':<10}",
+                lambda item: f'{item.nome:<30} R${item.valor:<9.2f}',
+                [("Nome", CardapioItem._nome), ("Valor", CardapioItem._valor)],
+                busca=CardapioItem._nome,
+            )
         elif opcao == '5':
-            volta_menu()
+            return
         else:
             print("Opção inválida.")
             input("\nPressione Enter para continuar...")
-            menu_cardapio()
 
 # ====== ESTOQUE PRODUTO ======
 def menu_estoque():
     while True:
+        session.remove()
         exibir_titulo('ESTOQUE DE PRODUTOS')
         print('1. Adicionar Item')
         print('2. Alterar Item')
@@ -642,98 +2331,108 @@ def menu_estoque():
             nome = input('Nome: ').strip()
             try:
                 quantidade = int(input('Quantidade: '))
-                valor = float(input('Valor: '))
+                valor = para_dinheiro(input('Valor: '))
                 if quantidade < 0 or valor < 0:
                     print("Quantidade e valor devem ser positivos.")
                     continue
-                if session.query(EstoqueItem).filter_by(nome=nome).first():
-                    print("Já existe um item com esse nome.")
-                    continue
-                item = EstoqueItem(nome=nome, quantidade=quantidade, valor=valor)
-                session.add(item)
-                session.commit()
-                print("Item adicionado com sucesso!")
+                with instrumentacao.operacao('cadastrar item de estoque'):
+                    cadastrar_item_estoque(nome, quantidade, valor, esperar=False)
+                informar_gravacao("Item adicionado com sucesso!")
             except ValueError:
                 print("Erro: Digite valores válidos para quantidade e valor.")
-            except IntegrityError:
-                session.rollback()
-                print("Erro: Não foi possível adicionar o item.")
+            except IntegrityError:  # só na gravação imediata; em lote o erro vem depois
+                print("Já existe um item com esse nome.")
 
         elif opcao == '2':
-            nome = input('Nome do item a alterar: ').strip()
-            item = session.query(EstoqueItem).filter_by(_nome=nome).first()
+            item_id = escolher_registro('estoque', 'Nome do item a alterar: ')
+            item = session.get(EstoqueItem, item_id) if item_id else None
             if item:
                 novo_nome = input(f'Novo nome ({item.nome}): ').strip()
                 nova_quantidade = input(f'Nova quantidade ({item.quantidade}): ').strip()
                 novo_valor = input(f'Novo valor (R${item.valor:.2f}): ').strip()
+                quantidade = valor = None
                 
-                if novo_nome:
-                    item.nome = novo_nome
                 if nova_quantidade:
                     try:
-                        item.quantidade = int(nova_quantidade)
+                        quantidade = int(nova_quantidade)
                     except ValueError:
                         print("Quantidade inválida. Alteração ignorada.")
                 if novo_valor:
                     try:
-                        item.valor = float(novo_valor)
+                        valor = para_dinheiro(novo_valor)
                     except ValueError:
                         print("Valor inválido. Alteração ignorada.")
 
-                session.commit()
-                print("Item alterado com sucesso!")
+                try:
+                    with instrumentacao.operacao('alterar item de estoque'):
+                        alterar_item_estoque(item.id, novo_nome, quantidade, valor, esperar=False)
+                    informar_gravacao("Item alterado com sucesso!")
+                except IntegrityError:  # só na gravação imediata
+                    print("Já existe um item com esse nome.")
             else:
                 print("Item não encontrado.")
 
         elif opcao == '3':
-            nome = input('Nome do item a remover: ').strip()
-            item = session.query(EstoqueItem).filter_by(_nome=nome).first()
-            if item:
-                session.delete(item)
-                session.commit()
-                print("Item removido com sucesso!")
+            item_id = escolher_registro('estoque', 'Nome do item a remover: ')
+            item = session.get(EstoqueItem, item_id) if item_id else None
+            if item and item.receitas:
+                produtos = ', '.join(receita.produto.nome for receita in item.receitas)
+                print(f"O item é usado na receita de: {produtos}. Remova-o das receitas antes.")
+            elif item and not confirmar(f"Remover '{item.nome}' do estoque?"):
+                print("Remoção cancelada.")
+            elif item:
+                with instrumentacao.operacao('remover item de estoque'):
+                    remover_item_estoque(item.id, esperar=False)
+                informar_gravacao("Item removido com sucesso!")
             else:
                 print("Item não encontrado.")
 
         elif opcao == '4':
-            limpar_tela()
-            itens = session.query(EstoqueItem).all()
-            if not itens:
-                print("\nNenhum produto no estoque.\n")
-            else:
-                print("\n--- ESTOQUE ---\n")
-                print(f"{'Nome do Produto':<20} {'Quantidade':<15} {'Valor':<15}")
-                print("-" * 60)
-                for item in itens:
-                    print(f'{item.nome:<25} {item.quantidade:<10} R${item.valor:<9.2f}')
-                print("-" * 60)
-            input("\nPressione Enter para continuar...")
+            exibir_listagem(
+                "ESTOQUE", EstoqueItem,
+                f"{'Nome do Produto':<25} {'Quantidade':<10} {'Valor':<15}",
+                lambda item: f'{item.nome:<25} {item.quantidade:<10} R${item.valor:<9.2f}',
+                [("Nome", EstoqueItem._nome), ("Quantidade", EstoqueItem._quantidade), ("Valor", EstoqueItem._valor)],
+                busca=EstoqueItem._nome,
+            )
         elif opcao == '5':
-            volta_menu()
+            return
         else:
             print('Opção inválida.')
             input("\nPressione Enter para continuar...")
-            volta_menu()
 
 # ====== PAGAMENTO ======
-def visualizar_pagamentos():
+def visualizar_pagamentos(tamanho_pagina=20):
+    gravacao_em_lote.descarregar()
     limpar_tela()
     exibir_titulo('PAGAMENTOS REGISTRADOS')
 
-    pagamentos_encontrados = False
-    clientes = session.query(Cliente).all()
+    print("Filtros (tecle Enter para ignorar):")
+    filtros = {
+        'tipo': input("Tipo de pagamento: ").strip() or None,
+        'cliente_id': obter_numero_opcional("ID do cliente: ", int),
+        'valor_min': obter_numero_opcional("Valor mínimo: R$ ", para_dinheiro),
+        'valor_max': obter_numero_opcional("Valor máximo: R$ ", para_dinheiro),
+    }
 
-    for cliente in clientes:
-        if cliente.pagamentos:
-            pagamentos_encontrados = True
-            for pagamento in cliente.pagamentos:
-                print(f'{cliente.nome} - {pagamento.tipo} - R${pagamento.valor:.2f}')
-
-    if not pagamentos_encontrados:
-        print("Nenhum pagamento registrado.")
+    cursor = None
+    while True:
+        with instrumentacao.operacao('listagem de pagamentos'):
+            pagamentos = Pagamento.listar(apos_id=cursor, limite=tamanho_pagina, **filtros)
+        if not pagamentos:
+            if cursor is None:
+                print("\nNenhum pagamento registrado.")
+            break
+        print()
+        for pagamento in pagamentos:
+            print(f'{pagamento.cliente} - {pagamento.tipo} - R${pagamento.valor:.2f}')
+        if len(pagamentos) < tamanho_pagina:
+            break
+        if input("\nEnter para a próxima página ou 'S' para sair: ").strip().upper() == 'S':
+            break
+        cursor = pagamentos[-1].id
 
     input("\nPressione Enter para continuar...")
-    volta_menu()
 
 # ====== REGISTRAR PAGAMENTO ======
 
@@ -741,57 +2440,63 @@ def registrar_pagamento():
     limpar_tela()
     exibir_titulo('REGISTRAR PAGAMENTO')
 
-    clientes = session.query(Cliente).all()
-
-    if not clientes:
-        print("Nenhum cliente cadastrado.")
-        input("\nPressione Enter para voltar...")
-        return volta_menu()
-
-    print("Clientes disponíveis:")
-    for cliente in clientes:
-        print(f'{cliente.id} - {cliente.nome}')
-
     try:
-        cliente_id = int(input("\nDigite o ID do cliente para o pagamento: "))
-        cliente = session.query(Cliente).filter_by(id=cliente_id).first()
-
-        if not cliente:
+        cliente_id = escolher_registro('clientes', "Nome ou CPF do cliente para o pagamento: ")
+        cliente = session.get(Cliente, cliente_id) if cliente_id else None
+        if cliente is None:
             print("Cliente não encontrado.")
             input("\nPressione Enter para voltar...")
-            return volta_menu()
+            return
 
         tipo = input("Digite o tipo de pagamento (Dinheiro, Cartão, etc.): ")
-        valor = float(input("Digite o valor do pagamento: R$ "))
-        pagamento = Pagamento(tipo=tipo, valor=valor, cliente=cliente)
-        session.add(pagamento)
-        session.commit()
-        print("\nPagamento registrado com sucesso!")
+        valor = para_dinheiro(input("Digite o valor do pagamento: R$ "))
+        if not confirmar(f"Registrar R${valor:.2f} ({tipo}) para {cliente.nome} (CPF {cliente.cpf})?"):
+            print("\nPagamento cancelado.")
+            input("\nPressione Enter para continuar...")
+            return
+        with instrumentacao.operacao('registrar pagamento'):
+            efetuar_pagamento(cliente_id, tipo, valor, esperar=False)
+        print()
+        informar_gravacao("Pagamento registrado com sucesso!")
     except Exception as e:
         print(f"\n Erro ao registrar pagamento: {e}")
         session.rollback()
     input("\nPressione Enter para continuar...")
-    volta_menu()
 
 # ====== RELATÓRIOS ======
 def menu_relatorios():
     while True:
+        session.remove()
+        gravacao_em_lote.descarregar()
         exibir_titulo("RELATÓRIOS E ESTATÍSTICAS")
         print("1. Relatório de Clientes")
         print("2. Relatório de Funcionários")
         print("3. Relatório de Estoque")
-        print("4. Voltar")
+        print("4. Vendas do Dia")
+        print("5. Vendas por Período")
+        print("6. Formas de Pagamento")
+        print("7. Produtos Mais Vendidos")
+        print("8. Fechamento do Dia")
+        print("9. Voltar")
         
         opcao = input("Escolha uma opção: ")
         if opcao == "1":
             limpar_tela()
             exibir_titulo("RELATÓRIO DE CLIENTES")
-            total = Cliente.total_clientes_cadastrados()
+            with instrumentacao.operacao('relatório de clientes'):
+                total = Cliente.total_clientes_cadastrados()
+                histograma = Cliente.histograma_faixas_etarias()
             print(f"\nTotal de clientes cadastrados: {total}")
+            print(f"\n{'Faixa etária':<15} {'Clientes':<10} {'%':<6}")
+            print("-" * 31)
+            for linha in histograma:
+                participacao = linha.total / total * 100 if total else 0
+                print(f"{linha.faixa:<15} {linha.total:<10} {participacao:.1f}%")
             print("\nClientes por faixa etária:")
             idade_min = int(input("Idade mínima: "))
             idade_max = int(input("Idade máxima: "))
-            clientes = Cliente.clientes_por_faixa_etaria(idade_min, idade_max)
+            with instrumentacao.operacao('clientes por faixa etária'):
+                clientes = Cliente.clientes_por_faixa_etaria(idade_min, idade_max)
             if clientes:
                 print(f"\nClientes entre {idade_min} e {idade_max} anos:")
                 for cliente in clientes:
@@ -803,11 +2508,16 @@ def menu_relatorios():
         elif opcao == "2":
             limpar_tela()
             exibir_titulo("RELATÓRIO DE FUNCIONÁRIOS")
-            funcionarios_por_cargo = Funcionario.total_funcionarios_por_cargo()
+            with instrumentacao.operacao('relatório de funcionários'):
+                resumo = Funcionario.resumo_por_cargo()
             print("\nFuncionários por cargo:")
-            for cargo, total in funcionarios_por_cargo.items():
-                print(f"{cargo}: {total}")
-            media = Funcionario.media_salarial()
+            print(f"{'Cargo':<20} {'Qtd.':<6} {'Soma':<14} {'Média':<12} {'Mínimo':<12} {'Máximo':<12}")
+            print("-" * 80)
+            for linha in resumo:
+                print(f"{linha.cargo or '-':<20} {linha.total:<6} R${linha.soma or 0:<12.2f} "
+                      f"R${linha.media or 0:<10.2f} R${linha.minimo or 0:<10.2f} R${linha.maximo or 0:<10.2f}")
+            print("-" * 80)
+            media = _media(sum(linha.soma or 0 for linha in resumo), sum(linha.com_salario for linha in resumo))
             if media is not None:
                 print(f"\nMédia salarial: R${media:.2f}")
             else:
@@ -817,19 +2527,139 @@ def menu_relatorios():
         elif opcao == "3":
             limpar_tela()
             exibir_titulo("RELATÓRIO DE ESTOQUE")
-            produtos_baixo_estoque = Produto.produtos_abaixo_estoque()
+            with instrumentacao.operacao('relatório de estoque'):
+                produtos_baixo_estoque = Produto.produtos_abaixo_estoque()
+                valores = [
+                    (titulo, modelo.valor_total_estoque(), modelo.valor_estoque_por_item(limite=5))
+                    for titulo, modelo in (("Produtos", Produto), ("Itens de estoque", EstoqueItem))
+                ]
             if produtos_baixo_estoque:
                 print("\nProdutos com estoque baixo:")
                 for produto in produtos_baixo_estoque:
                     print(f"{produto.nome} - {produto.quantidade} unidades")
             else:
                 print("\nNenhum produto com estoque baixo.")
-            valor_total = Produto.valor_total_estoque()
-            print(f"\nValor total em estoque: R${valor_total:.2f}")
+            for titulo, valor_total, maiores in valores:
+                print(f"\n{titulo} - valor total em estoque: R${valor_total:.2f}")
+                if maiores:
+                    print("Maior valor imobilizado:")
+                    for item in maiores:
+                        print(f"  {item.nome:<25} {item.quantidade or 0:<6} R${item.valor_total or 0:.2f}")
             
             input("\nPressione Enter para continuar...")
         elif opcao == "4":
-            volta_menu()
+            limpar_tela()
+            exibir_titulo("VENDAS DO DIA")
+            dia = obter_data_opcional("Dia (DD/MM/AAAA, Enter para hoje): ", date.today())
+            with instrumentacao.operacao('relatório de vendas do dia'):
+                horas = ResumoVendasHora.do_dia(dia)
+            if horas:
+                print(f"\n{'Hora':<8} {'Pedidos':<10} {'Receita':<12}")
+                print("-" * 32)
+                for linha in horas:
+                    print(f"{linha.hora:%H:%M}    {linha.pedidos:<10} R${linha.receita:.2f}")
+                print("-" * 32)
+                pedidos = sum(linha.pedidos for linha in horas)
+                receita = sum(linha.receita for linha in horas)
+                print(f"Total: {pedidos} pedido(s), R${receita:.2f}, ticket médio R${_media(receita, pedidos):.2f}")
+            else:
+                print("\nNenhuma venda neste dia.")
+            input("\nPressione Enter para continuar...")
+        elif opcao == "5":
+            limpar_tela()
+            exibir_titulo("VENDAS POR PERÍODO")
+            inicio, fim = obter_periodo()
+            with instrumentacao.operacao('relatório de vendas por período'):
+                dias = ResumoVendasDia.periodo(inicio, fim)
+            if dias:
+                print(f"\n{'Dia':<12} {'Pedidos':<10} {'Receita':<14} {'Ticket médio':<12}")
+                print("-" * 50)
+                for linha in dias:
+                    print(f"{linha.dia:%d/%m/%Y}   {linha.pedidos:<10} R${linha.receita:<12.2f} R${linha.ticket_medio:.2f}")
+                print("-" * 50)
+                pedidos = sum(linha.pedidos for linha in dias)
+                receita = sum(linha.receita for linha in dias)
+                print(f"Total: {pedidos} pedido(s), R${receita:.2f}, ticket médio R${_media(receita, pedidos):.2f}")
+            else:
+                print("\nNenhuma venda no período.")
+            input("\nPressione Enter para continuar...")
+        elif opcao == "6":
+            limpar_tela()
+            exibir_titulo("FORMAS DE PAGAMENTO")
+            inicio, fim = obter_periodo()
+            with instrumentacao.operacao('relatório de formas de pagamento'):
+                mix = ResumoPagamentosDia.mix(inicio, fim)
+            if mix:
+                total = sum(linha.valor for linha in mix)
+                print(f"\n{'Tipo':<15} {'Qtd.':<8} {'Valor':<14} {'Part.':<6}")
+                print("-" * 45)
+                for linha in mix:
+                    participacao = linha.valor / total * 100 if total else 0
+                    print(f"{(linha.tipo or '—').capitalize():<15} {linha.quantidade:<8} R${linha.valor:<12.2f} {participacao:.1f}%")
+                print("-" * 45)
+            else:
+                print("\nNenhum pagamento no período.")
+            input("\nPressione Enter para continuar...")
+        elif opcao == "7":
+            limpar_tela()
+            exibir_titulo("PRODUTOS MAIS VENDIDOS")
+            inicio, fim = obter_periodo()
+            with instrumentacao.operacao('relatório de mais vendidos'):
+                produtos = ResumoProdutosDia.mais_vendidos(inicio, fim)
+            if produtos:
+                print(f"\n{'Produto':<25} {'Qtd.':<8} {'Receita':<12}")
+                print("-" * 47)
+                for linha in produtos:
+                    print(f"{linha.nome:<25} {linha.quantidade:<8} R${linha.receita:.2f}")
+                print("-" * 47)
+            else:
+                print("\nNenhuma venda no período.")
+            input("\nPressione Enter para continuar...")
+        elif opcao == "8":
+            limpar_tela()
+            exibir_titulo("FECHAMENTO DO DIA")
+            dia = obter_data_opcional("Dia (DD/MM/AAAA, Enter para hoje): ", date.today())
+            with instrumentacao.operacao('fechamento do dia'):
+                fechamento = fechamento_do_dia(dia)
+            print(f"\nPedidos: {fechamento['pedidos']}")
+            print(f"Total vendido: R${fechamento['vendido']:.2f}")
+            print("\nRecebido por forma de pagamento:")
+            for tipo, quantidade, total in fechamento['pagamentos']:
+                print(f"  {(tipo or '—').capitalize():<15} {quantidade:<6} R${total:.2f}")
+            print(f"Total recebido: R${fechamento['recebido']:.2f}")
+            print(f"Diferença (vendido - recebido): R${fechamento['diferenca']:.2f}")
+            input("\nPressione Enter para continuar...")
+        elif opcao == "9":
+            return
+        else:
+            print("Opção inválida.")
+            input("\nPressione Enter para continuar...")
+
+# ====== MENU DIAGNÓSTICO ======
+def menu_diagnostico():
+    while True:
+        exibir_titulo('DIAGNÓSTICO DAS CONSULTAS')
+        print(f"Instrumentação: {'ligada' if instrumentacao.ativa else 'desligada'}")
+        print(f"Consultas lentas (>= {instrumentacao.limite_lento_ms:g} ms) e possíveis N+1 vão para "
+              f"{instrumentacao.arquivo_lentas}\n")
+        exibir_instrumentacao()
+        estatisticas = cache_cardapio.estatisticas()
+        print(f"\nCache do cardápio: {estatisticas['acertos']} acerto(s), {estatisticas['falhas']} falha(s), "
+              f"{estatisticas['invalidacoes']} invalidação(ões)")
+        print(f"\n1. {'Desligar' if instrumentacao.ativa else 'Ligar'} Instrumentação")
+        print('2. Zerar Contadores')
+        print('3. Voltar')
+        opcao = input('Escolha uma opção: ')
+
+        if opcao == '1':
+            if instrumentacao.ativa:
+                instrumentacao.desativar()
+            else:
+                instrumentacao.ativar()
+        elif opcao == '2':
+            instrumentacao.zerar()
+        elif opcao == '3':
+            return
         else:
             print("Opção inválida.")
             input("\nPressione Enter para continuar...")
@@ -844,8 +2674,559 @@ def sair():
     limpar_tela()
     exit(0)
 
-# ====== CRIAÇÃO DAS TABELAS NO BANCO DE DADOS ======
-Base.metadata.create_all(engine)
+# ====== IMPORTAÇÃO E EXPORTAÇÃO EM LOTE ======
+def _ler_data(texto):
+    """Aceita AAAA-MM-DD ou DD/MM/AAAA"""
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"data inválida '{texto}' (use AAAA-MM-DD ou DD/MM/AAAA)")
+
+class _Opcional:
+    """Conversor de campo que pode vir vazio ou faltar no arquivo (grava NULL)"""
+
+    def __init__(self, conversor):
+        self.conversor = conversor
+
+    def __call__(self, valor):
+        return self.conversor(valor)
+
+# entidade: (modelo, {coluna: conversor}, coluna única ou None)
+ENTIDADES_LOTE = {
+    'clientes': (Cliente, {'nome': str, 'cpf': str, 'idade': int, 'data_nascimento': _ler_data}, 'cpf'),
+    'produtos': (Produto, {'nome': str, 'valor': para_dinheiro, 'quantidade': int,
+                           'cardapio_item_id': _Opcional(int)}, None),
+    'cardapio': (CardapioItem, {'nome': str, 'valor': para_dinheiro}, 'nome'),
+    'estoque': (EstoqueItem, {'nome': str, 'quantidade': int, 'valor': para_dinheiro}, 'nome'),
+    'receitas': (Receita, {'produto_id': int, 'estoque_item_id': int, 'quantidade': int}, None),
+}
+
+def _coluna_lote(tabela, campo):
+    # os campos de dinheiro são gravados nas colunas em centavos
+    return tabela.c[campo] if campo in tabela.c else tabela.c[f'{campo}_centavos']
+
+def _converter_linha(tabela, campos, linha):
+    registro = {}
+    for campo, conversor in campos.items():
+        valor = linha.get(campo)
+        if valor is None or (isinstance(valor, str) and not valor.strip()):
+            if not isinstance(conversor, _Opcional):
+                raise ValueError(f"campo '{campo}' vazio")
+            registro[_coluna_lote(tabela, campo).name] = None
+            continue
+        registro[_coluna_lote(tabela, campo).name] = conversor(valor.strip() if isinstance(valor, str) else valor)
+    return registro
+
+def _inserir_lote(tabela, lote, ao_errar):
+    """Insere o lote num único executemany; se o banco recusar, isola as linhas culpadas"""
+    try:
+        session.execute(insert(tabela), [registro for _, registro in lote])
+        session.commit()
+        return len(lote)
+    except IntegrityError:
+        session.rollback()
+
+    inseridos = 0
+    for numero, registro in lote:
+        try:
+            with session.begin_nested():
+                session.execute(insert(tabela), registro)
+            inseridos += 1
+        except IntegrityError as erro:
+            ao_errar(numero, f"rejeitada pelo banco: {erro.orig}")
+    session.commit()
+    return inseridos
+
+def importar_registros(entidade, linhas, tamanho_lote=1000, ao_errar=None):
+    """Importa linhas de CSV/JSONL em lotes com uma transação por lote.
+
+    `linhas` são pares (número da linha, dicionário), como os de _ler_arquivo;
+    no lugar do dicionário pode vir o ValueError de uma linha ilegível. Linhas
+    inválidas ou duplicadas são informadas a ao_errar(numero, mensagem) e
+    puladas sem abortar o lote. Retorna (inseridos, rejeitados).
+    """
+    modelo, campos, coluna_unica = ENTIDADES_LOTE[entidade]
+    tabela = modelo.__table__
+    rejeitados = 0
+
+    def rejeitar(numero, mensagem):
+        nonlocal rejeitados
+        rejeitados += 1
+        if ao_errar:
+            ao_errar(numero, mensagem)
+
+    def gravar(lote):
+        if coluna_unica and lote:
+            chaves = [registro[coluna_unica] for _, registro in lote]
+            existentes = set(session.scalars(select(tabela.c[coluna_unica]).where(tabela.c[coluna_unica].in_(chaves))))
+            vistos = set()
+            aceitos = []
+            for numero, registro in lote:
+                chave = registro[coluna_unica]
+                if chave in existentes or chave in vistos:
+                    rejeitar(numero, f"{coluna_unica} '{chave}' já cadastrado")
+                else:
+                    vistos.add(chave)
+                    aceitos.append((numero, registro))
+            lote = aceitos
+        return _inserir_lote(tabela, lote, rejeitar) if lote else 0
+
+    inseridos = 0
+    lote = []
+    for numero, linha in linhas:
+        if isinstance(linha, ValueError):
+            rejeitar(numero, str(linha))
+            continue
+        try:
+            lote.append((numero, _converter_linha(tabela, campos, linha)))
+        except (ValueError, TypeError) as erro:
+            rejeitar(numero, str(erro))
+        if len(lote) >= tamanho_lote:
+            inseridos += gravar(lote)
+            lote = []
+    inseridos += gravar(lote)
+    session.remove()
+    if entidade in indices_busca:
+        indices_busca[entidade].invalidar()
+    if modelo in (CardapioItem, Produto):
+        cache_cardapio.invalidar()
+    return inseridos, rejeitados
+
+def exportar_registros(entidade, tamanho_lote=1000):
+    """Gera os registros da entidade como dicionários, lidos do banco em streaming"""
+    modelo, campos, _ = ENTIDADES_LOTE[entidade]
+    tabela = modelo.__table__
+    consulta = select(*(_coluna_lote(tabela, campo).label(campo) for campo in campos)).order_by(*tabela.primary_key)
+    try:
+        for linha in session.execute(consulta.execution_options(yield_per=tamanho_lote)):
+            registro = dict(linha._mapping)
+            for campo, valor in registro.items():
+                if hasattr(valor, 'isoformat'):
+                    registro[campo] = valor.isoformat()
+                elif isinstance(valor, Decimal):
+                    registro[campo] = str(valor)
+            yield registro
+    finally:
+        session.remove()
+
+def _ler_arquivo(caminho):
+    """Gera (número da linha no arquivo, dicionário); uma linha JSONL que não é
+    um objeto JSON vem com um ValueError no lugar do dicionário"""
+    with open(caminho, newline='', encoding='utf-8') as arquivo:
+        if caminho.endswith('.jsonl'):
+            for numero, linha in enumerate(arquivo, start=1):
+                if not linha.strip():
+                    continue
+                try:
+                    registro = json.loads(linha)
+                except ValueError as erro:
+                    yield numero, ValueError(f"JSON inválido: {erro}")
+                    continue
+                if isinstance(registro, dict):
+                    yield numero, registro
+                else:
+                    yield numero, ValueError("a linha não é um objeto JSON")
+        else:
+            leitor = csv.DictReader(arquivo)
+            for registro in leitor:
+                yield leitor.line_num, registro
+
+def _escrever_arquivo(caminho, campos, registros):
+    total = 0
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        if caminho.endswith('.jsonl'):
+            for registro in registros:
+                arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+                total += 1
+        else:
+            escritor = csv.DictWriter(arquivo, fieldnames=list(campos))
+            escritor.writeheader()
+            for registro in registros:
+                escritor.writerow(registro)
+                total += 1
+    return total
+
+def comando_importar(argumentos):
+    def ao_errar(numero, mensagem):
+        print(f"Linha {numero}: {mensagem}", file=sys.stderr)
+
+    inicio = time.perf_counter()
+    inseridos, rejeitados = importar_registros(
+        argumentos.entidade, _ler_arquivo(argumentos.arquivo), argumentos.lote, ao_errar
+    )
+    print(f"{inseridos} registro(s) importado(s), {rejeitados} rejeitado(s) em {time.perf_counter() - inicio:.2f}s.")
+
+def comando_exportar(argumentos):
+    _, campos, _ = ENTIDADES_LOTE[argumentos.entidade]
+    total = _escrever_arquivo(argumentos.arquivo, campos, exportar_registros(argumentos.entidade, argumentos.lote))
+    print(f"{total} registro(s) exportado(s) para {argumentos.arquivo}.")
+
+# ====== MIGRAÇÕES DO ESQUEMA ======
+# Cada migração é (versão, descrição, passo, online). O passo recebe a
+# conexão e um inspetor do banco e gera os comandos SQL, que são executados
+# (ou só exibidos, no --dry-run) em ordem. As versões aplicadas ficam em
+# versoes_esquema; uma migração normal roda numa única transação exclusiva
+# com o registro da sua versão (ver _transacao_de_migracao). Nas migrações "online" (criação de índices) cada
+# comando tem a sua transação curta, para não travar os outros terminais, e
+# no PostgreSQL usa CREATE INDEX CONCURRENTLY.
+#
+# Os comandos de cada versão são escritos para o esquema daquela versão,
+# congelado aqui, e não gerados dos modelos atuais: um banco novo passa pelas
+# mesmas versões que um antigo, e o SQL de uma migração publicada não muda
+# quando os modelos mudam. Mudanças novas entram no fim da lista; uma
+# migração aplicada nunca deve ser alterada.
+
+class VersaoEsquema(Base):
+    __tablename__ = 'versoes_esquema'
+    versao = Column(Integer, primary_key=True)
+    descricao = Column(String, nullable=False)
+    aplicada_em = Column(DateTime, nullable=False, default=datetime.now)
+
+def _tabelas_v1(metadados):
+    """Esquema original, de antes do controle de versão (dinheiro em reais)"""
+    Table('clientes', metadados,
+          Column('id', Integer, primary_key=True), Column('nome', String), Column('cpf', String, unique=True),
+          Column('idade', Integer), Column('data_nascimento', Date))
+    Table('funcionarios', metadados,
+          Column('id', Integer, primary_key=True), Column('nome', String), Column('cpf', String, unique=True),
+          Column('idade', Integer), Column('data_nascimento', Date), Column('cargo', String),
+          Column('salario', Float))
+    Table('produtos', metadados,
+          Column('id', Integer, primary_key=True), Column('nome', String), Column('valor', Float),
+          Column('quantidade', Integer))
+    Table('pagamentos', metadados,
+          Column('id', Integer, primary_key=True), Column('tipo', String), Column('valor', Float),
+          Column('cliente_id', Integer, ForeignKey('clientes.id')))
+    Table('estoque', metadados,
+          Column('id', Integer, primary_key=True), Column('nome', String), Column('quantidade', Integer),
+          Column('valor', Float))
+    Table('pedidos', metadados,
+          Column('id', Integer, primary_key=True), Column('comanda', String), Column('valor', Float),
+          Column('cliente_id', Integer, ForeignKey('clientes.id')))
+    Table('pedido_produto', metadados,
+          Column('pedido_id', Integer, ForeignKey('pedidos.id'), primary_key=True),
+          Column('produto_id', Integer, ForeignKey('produtos.id'), primary_key=True))
+    Table('cardapio', metadados,
+          Column('id', Integer, primary_key=True), Column('nome', String), Column('valor', Float))
+    return metadados
+
+def _tabelas_novas_v2(metadados):
+    """Tabelas criadas na versão 2; as chaves estrangeiras apontam para as da versão 1"""
+    return [
+        Table('itens_pedido', metadados,
+              Column('id', Integer, primary_key=True),
+              Column('pedido_id', Integer, ForeignKey('pedidos.id'), nullable=False),
+              Column('produto_id', Integer, ForeignKey('produtos.id'), nullable=False),
+              Column('quantidade', Integer, nullable=False),
+              Column('valor_unitario_centavos', Integer, nullable=False)),
+        Table('receitas', metadados,
+              Column('produto_id', Integer, ForeignKey('produtos.id'), primary_key=True),
+              Column('estoque_item_id', Integer, ForeignKey('estoque.id'), primary_key=True),
+              Column('quantidade', Integer, nullable=False)),
+        Table('sequencias_comanda', metadados,
+              Column('cliente_id', Integer, ForeignKey('clientes.id'), primary_key=True),
+              Column('ultimo_numero', Integer, nullable=False)),
+        Table('resumo_vendas_dia', metadados,
+              Column('dia', Date, primary_key=True), Column('pedidos', Integer, nullable=False),
+              Column('receita', Integer, nullable=False)),
+        Table('resumo_vendas_hora', metadados,
+              Column('hora', DateTime, primary_key=True), Column('pedidos', Integer, nullable=False),
+              Column('receita', Integer, nullable=False)),
+        Table('resumo_pagamentos_dia', metadados,
+              Column('dia', Date, primary_key=True), Column('tipo', String, primary_key=True),
+              Column('quantidade', Integer, nullable=False), Column('valor', Integer, nullable=False)),
+        Table('resumo_produtos_dia', metadados,
+              Column('dia', Date, primary_key=True),
+              Column('produto_id', Integer, ForeignKey('produtos.id'), primary_key=True),
+              Column('quantidade', Integer, nullable=False), Column('receita', Integer, nullable=False)),
+    ]
+
+# (tabela, coluna nova, tipo, coluna em reais de onde vêm os centavos, tabela referenciada)
+COLUNAS_V2 = [
+    ('cardapio', 'valor_centavos', Integer, 'valor', None),
+    ('estoque', 'valor_centavos', Integer, 'valor', None),
+    ('funcionarios', 'salario_centavos', Integer, 'salario', None),
+    ('pagamentos', 'valor_centavos', Integer, 'valor', None),
+    ('pagamentos', 'criado_em', DateTime, None, None),
+    ('pedidos', 'valor_centavos', Integer, 'valor', None),
+    ('pedidos', 'criado_em', DateTime, None, None),
+    ('produtos', 'valor_centavos', Integer, 'valor', None),
+    ('produtos', 'cardapio_item_id', Integer, None, 'cardapio'),
+]
+
+# (nome, tabela, colunas, único)
+INDICES_V4 = [
+    ('ix_cardapio_nome', 'cardapio', ('nome',), True),
+    ('ix_clientes_idade', 'clientes', ('idade',), False),
+    ('ix_estoque_nome', 'estoque', ('nome',), True),
+    ('ix_pagamentos_cliente_id', 'pagamentos', ('cliente_id',), False),
+    ('ix_pagamentos_criado_em', 'pagamentos', ('criado_em',), False),
+    ('ix_pedidos_cliente_id', 'pedidos', ('cliente_id',), False),
+    ('ix_pedidos_criado_em', 'pedidos', ('criado_em',), False),
+    ('ix_produtos_cardapio_item_id', 'produtos', ('cardapio_item_id',), False),
+    ('ix_itens_pedido_pedido_id', 'itens_pedido', ('pedido_id',), False),
+    ('ix_receitas_estoque_item_id', 'receitas', ('estoque_item_id',), False),
+]
+
+def _criar_tabelas(conexao, inspetor):
+    existentes = set(inspetor.get_table_names())
+    for tabela in _tabelas_v1(MetaData()).sorted_tables:
+        if tabela.name not in existentes:
+            yield CreateTable(tabela)
+
+def _adicionar_colunas(conexao, inspetor):
+    """Tabelas novas e colunas novas da versão 2.
+
+    As colunas de dinheiro em centavos são preenchidas a partir da antiga
+    coluna em reais, e as linhas de pedido_produto viram itens_pedido.
+    """
+    existentes_no_banco = set(inspetor.get_table_names())
+    v1 = _tabelas_v1(MetaData())
+    novas = _tabelas_novas_v2(v1)
+    for tabela in novas:
+        if tabela.name not in existentes_no_banco:
+            yield CreateTable(tabela)
+    for tabela, coluna, tipo, origem, referencia in COLUNAS_V2:
+        if tabela in existentes_no_banco:
+            existentes = {coluna['name'] for coluna in inspetor.get_columns(tabela)}
+        else:
+            existentes = set(v1.tables[tabela].columns.keys())  # criada agora pela versão 1 (dry-run)
+        if coluna not in existentes:
+            sql = f'ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo().compile(dialect=conexao.dialect)}'
+            yield f'{sql} REFERENCES {referencia} (id)' if referencia else sql
+        # sempre emitido: refazer a migração completa o que uma execução interrompida deixou
+        if origem in existentes:
+            yield (f'UPDATE {tabela} SET {coluna} = CAST(ROUND({origem} * 100) AS INTEGER) '
+                   f'WHERE {coluna} IS NULL AND {origem} IS NOT NULL')
+    yield _copiar_pedido_produto(v1, novas[0])
+
+def _copiar_pedido_produto(v1, itens_pedido):
+    """Cada par (pedido, produto) antigo vira um item de uma unidade, pelo
+    preço atual do produto; pedidos que já têm itens ficam como estão"""
+    pedido_produto, produtos = v1.tables['pedido_produto'], v1.tables['produtos']
+    valor_centavos = Column('valor_centavos', Integer)  # entrou por ALTER TABLE logo acima
+    produtos.append_column(valor_centavos)
+    ja_copiado = select(itens_pedido.c.id).where(itens_pedido.c.pedido_id == pedido_produto.c.pedido_id).exists()
+    return insert(itens_pedido).from_select(
+        ['pedido_id', 'produto_id', 'quantidade', 'valor_unitario_centavos'],
+        select(pedido_produto.c.pedido_id, pedido_produto.c.produto_id, literal(1),
+               func.coalesce(valor_centavos, 0))
+        .join(produtos, produtos.c.id == pedido_produto.c.produto_id)
+        .where(~ja_copiado),
+    )
+
+def _vinculos_por_nome():
+    """Comandos que ligam pelo nome o que ainda não tem vínculo por chave.
+
+    Produto sem item do cardápio recebe o item de mesmo nome e produto sem
+    receita passa a consumir uma unidade do item de estoque de mesmo nome.
+    """
+    v2 = _tabelas_v1(MetaData())
+    _tabelas_novas_v2(v2)
+    produtos, cardapio, estoque, receitas = (v2.tables[nome] for nome in ('produtos', 'cardapio', 'estoque', 'receitas'))
+    # cardapio_item_id entrou por ALTER TABLE na versão 2
+    cardapio_item_id = Column('cardapio_item_id', Integer)
+    produtos.append_column(cardapio_item_id)
+    item_de_mesmo_nome = select(cardapio.c.id).where(cardapio.c.nome == produtos.c.nome)
+    sem_receita = ~select(receitas.c.produto_id).where(receitas.c.produto_id == produtos.c.id).exists()
+    return [
+        update(produtos)
+        .where(cardapio_item_id.is_(None), item_de_mesmo_nome.exists())
+        .values(cardapio_item_id=item_de_mesmo_nome.scalar_subquery()),
+        insert(receitas).from_select(
+            ['produto_id', 'estoque_item_id', 'quantidade'],
+            select(produtos.c.id, estoque.c.id, literal(1))
+            .join(estoque, estoque.c.nome == produtos.c.nome)
+            .where(sem_receita),
+        ),
+    ]
+
+def _vincular_catalogo(conexao, inspetor):
+    yield from _vinculos_por_nome()
+
+def _sql_criar_indice(conexao, indice):
+    sql = str(CreateIndex(indice, if_not_exists=True).compile(dialect=conexao.dialect))
+    if conexao.dialect.name == 'postgresql':
+        sql = sql.replace('INDEX', 'INDEX CONCURRENTLY', 1)
+    return sql
+
+def _indices_existentes(inspetor, tabela):
+    if not inspetor.has_table(tabela):
+        return set()
+    return {indice['name'] for indice in inspetor.get_indexes(tabela)}
+
+def _criar_indices_congelados(conexao, inspetor, indices):
+    for nome, tabela, colunas, unico in indices:
+        if nome in _indices_existentes(inspetor, tabela):
+            continue
+        alvo = Table(tabela, MetaData(), *(Column(coluna) for coluna in colunas))
+        yield _sql_criar_indice(conexao, Index(nome, *alvo.columns, unique=unico))
+
+def _criar_indices(conexao, inspetor):
+    yield from _criar_indices_congelados(conexao, inspetor, INDICES_V4)
+
+def _indexar_data_nascimento(conexao, inspetor):
+    yield from _criar_indices_congelados(
+        conexao, inspetor, [('ix_clientes_data_nascimento', 'clientes', ('data_nascimento',), False)])
+
+MIGRACOES = [
+    (1, 'cria as tabelas do esquema original', _criar_tabelas, False),
+    (2, 'cria as tabelas de itens, receitas e resumos, adiciona colunas e converte dinheiro para centavos',
+     _adicionar_colunas, False),
+    (3, 'liga produtos ao cardápio e ao estoque por chave', _vincular_catalogo, False),
+    (4, 'cria os índices das consultas', _criar_indices, True),
+    (5, 'indexa a data de nascimento dos clientes', _indexar_data_nascimento, True),
+]
+VERSAO_ATUAL = MIGRACOES[-1][0]
+
+def versao_do_esquema(conexao):
+    """Última versão aplicada; 0 para banco sem controle de versão"""
+    if not inspect(conexao).has_table(VersaoEsquema.__tablename__):
+        return 0
+    return conexao.execute(select(func.coalesce(func.max(VersaoEsquema.versao), 0))).scalar()
+
+def _sql(comando, dialeto):
+    if isinstance(comando, str):
+        return comando
+    try:
+        return str(comando.compile(dialect=dialeto, compile_kwargs={'literal_binds': True}))
+    except Exception:
+        return str(comando.compile(dialect=dialeto))
+
+def _executar_comando(conexao, comando):
+    conexao.execute(text(comando) if isinstance(comando, str) else comando)
+
+@contextmanager
+def _transacao_de_migracao(engine):
+    """Transação exclusiva para aplicar ou registrar uma migração.
+
+    O pysqlite executa DDL fora da transação que ele mesmo abre; por isso,
+    no SQLite, a conexão fica em autocommit e a transação é aberta à mão com
+    BEGIN IMMEDIATE, que também reserva a escrita. No PostgreSQL a tabela
+    versoes_esquema é travada. Assim um segundo terminal migrando ao mesmo
+    tempo espera o primeiro terminar em vez de repetir os comandos.
+    """
+    if engine.dialect.name != 'sqlite':
+        with engine.begin() as conexao:
+            if engine.dialect.name == 'postgresql':
+                conexao.execute(text(f'LOCK TABLE {VersaoEsquema.__tablename__} IN EXCLUSIVE MODE'))
+            yield conexao
+        return
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexao:
+        conexao.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            yield conexao
+        except BaseException:
+            conexao.exec_driver_sql('ROLLBACK')
+            raise
+        conexao.exec_driver_sql('COMMIT')
+
+def _versao_aplicada(conexao, versao):
+    return conexao.execute(select(VersaoEsquema.versao).where(VersaoEsquema.versao == versao)).first() is not None
+
+def migrar(dry_run=False, saida=print):
+    """Aplica em ordem as migrações pendentes; no dry_run só mostra o SQL.
+
+    Retorna as versões aplicadas (ou que seriam aplicadas).
+    """
+    engine = obter_engine()
+    with engine.connect() as conexao:
+        atual = versao_do_esquema(conexao)
+    pendentes = [migracao for migracao in MIGRACOES if migracao[0] > atual]
+    if dry_run:
+        saida(f"-- versão atual: {atual}; pendentes: {[versao for versao, *_ in pendentes] or 'nenhuma'}")
+    if pendentes and not dry_run:
+        with engine.begin() as conexao:
+            conexao.execute(CreateTable(VersaoEsquema.__table__, if_not_exists=True))
+    aplicadas = []
+
+    for versao, descricao, passo, online in pendentes:
+        if dry_run:
+            saida(f"\n-- {versao}: {descricao}{' (online)' if online else ''}")
+            with engine.connect() as conexao:
+                for comando in passo(conexao, inspect(conexao)):
+                    saida(_sql(comando, conexao.dialect).strip() + ';')
+            continue
+
+        registro = insert(VersaoEsquema).values(versao=versao, descricao=descricao, aplicada_em=datetime.now())
+        if online:
+            with engine.connect() as conexao:
+                comandos = list(passo(conexao, inspect(conexao)))
+            autocommit = {'isolation_level': 'AUTOCOMMIT'} if engine.dialect.name == 'postgresql' else {}
+            for comando in comandos:
+                with engine.connect().execution_options(**autocommit) as conexao:
+                    try:
+                        _executar_comando(conexao, comando)
+                        conexao.commit()
+                    except IntegrityError as erro:
+                        # índice único sobre valores repetidos: o resto do sistema funciona sem ele
+                        conexao.rollback()
+                        print(f"Aviso: não executado, há valores repetidos ({erro.orig}): {comando}")
+            with _transacao_de_migracao(engine) as conexao:
+                if not _versao_aplicada(conexao, versao):
+                    conexao.execute(registro)
+                    aplicadas.append(versao)
+        else:
+            with _transacao_de_migracao(engine) as conexao:
+                if _versao_aplicada(conexao, versao):
+                    continue  # outro terminal aplicou enquanto este esperava
+                for comando in list(passo(conexao, inspect(conexao))):
+                    _executar_comando(conexao, comando)
+                conexao.execute(registro)
+                aplicadas.append(versao)
+    return [versao for versao, *_ in pendentes] if dry_run else aplicadas
+
+def inicializar(url=None, **opcoes):
+    """Prepara o banco para uso; chamada uma vez pelos pontos de entrada.
+
+    Com o esquema na versão atual custa uma única consulta; senão (primeiro
+    uso ou versão nova do programa) aplica as migrações pendentes. Liga a
+    gravação em lote se RESTAURANTE_GRAVACAO_EM_LOTE=1.
+    """
+    engine = configurar_banco(url, **opcoes) if url or opcoes else obter_engine()
+    with engine.connect() as conexao:
+        atualizado = versao_do_esquema(conexao) == VERSAO_ATUAL
+    if not atualizado:
+        migrar()
+    if os.environ.get('RESTAURANTE_GRAVACAO_EM_LOTE') == '1' and not gravacao_em_lote.ativa:
+        gravacao_em_lote.ativar()
+        atexit.register(gravacao_em_lote.desativar)
+    return engine
+
+def comando_migrar(argumentos):
+    aplicadas = migrar(dry_run=argumentos.dry_run)
+    if not argumentos.dry_run:
+        if aplicadas:
+            print(f"Migrações aplicadas: {', '.join(map(str, aplicadas))}. Esquema na versão {VERSAO_ATUAL}.")
+        else:
+            print(f"Nada a fazer: esquema já está na versão {VERSAO_ATUAL}.")
+
+# ====== LINHA DE COMANDO ======
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sistema de gerenciamento do restaurante')
+    comandos = parser.add_subparsers(dest='comando')
+    for nome, ajuda, funcao in (('importar', 'importa registros de um arquivo .csv ou .jsonl', comando_importar),
+                                ('exportar', 'exporta registros para um arquivo .csv ou .jsonl', comando_exportar)):
+        sub = comandos.add_parser(nome, help=ajuda)
+        sub.add_argument('entidade', choices=sorted(ENTIDADES_LOTE))
+        sub.add_argument('arquivo')
+        sub.add_argument('--lote', type=int, default=1000, help='registros por transação (padrão: 1000)')
+        sub.set_defaults(funcao=funcao)
+    sub = comandos.add_parser('reconstruir-resumos', help='recalcula os resumos de vendas a partir do histórico')
+    sub.set_defaults(funcao=lambda _argumentos: reconstruir_resumos())
+    sub = comandos.add_parser('migrar', help='aplica as migrações pendentes do esquema do banco')
+    sub.add_argument('--dry-run', action='store_true', help='só mostra o SQL que seria executado')
+    sub.set_defaults(funcao=comando_migrar)
+
+    argumentos = parser.parse_args(argv)
+    if argumentos.comando != 'migrar':
+        inicializar()
+    if argumentos.comando is None:
+        sistema_login()
+    else:
+        argumentos.funcao(argumentos)
 
 if __name__ == '__main__':
-    sistema_login()
+    main()
@@ -0,0 +1,491 @@
+"""Benchmarks e testes de carga do sistema do restaurante.
+
+Uso:
+    python benchmark.py gerar [--banco URL] [--clientes 1000] [--meses 3] [--semente 42]
+    python benchmark.py medir [--tamanhos 1000,10000] [--meses 3] [--repeticoes 20] [--saida resultados.json]
+    python benchmark.py estresse [--workers 1,2,4,8] [--pedidos 400] [--estoque 300]
+    python benchmark.py lote [--operacoes 2000] [--workers 8] [--sincronizacao NORMAL,FULL] [--pasta DIR]
+    python benchmark.py inicio [--repeticoes 30]
+
+gerar: preenche um banco (por padrão o restaurante.db) com dados sintéticos:
+clientes, funcionários, produtos com cardápio, estoque e receitas, e meses
+de pedidos e pagamentos. As demais quantidades crescem com o número de
+clientes.
+
+medir: para cada tamanho, gera um banco temporário e cronometra as
+operações mais usadas (criar pedido, listagens e cada relatório do
+menu_relatorios). O resultado sai em JSON, para comparar entre versões.
+
+estresse: vários terminais (threads, cada uma com a sua sessão) criando
+pedidos ao mesmo tempo contra um banco novo, com menos estoque do que o
+total pedido. Confere que o estoque nunca fica negativo, que cada unidade
+vendida corresponde a um pedido gravado e mede pedidos por segundo para
+cada número de workers.
+
+lote: vazão de escritas curtas (pagamentos e ajustes de estoque) com um
+commit por operação e com a gravação em lote, para cada nível de
+synchronous. Mede um terminal que não espera a gravação (write-behind) e
+vários workers esperando o commit (group commit). Como o custo do fsync
+depende do disco, use --pasta para gravar no mesmo disco do restaurante.db.
+
+inicio: custo de subir o programa, em processos Python novos: só o import
+do app.py (que não toca no banco) e import + inicializar() num banco já na
+versão atual. Mostra a mediana do tempo de parede do processo e do tempo
+acumulado de `import app` medido por python -X importtime.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, insert, select
+
+import app
+
+# ====== BANCO DE TESTE ======
+def preparar_banco(pasta, nome, estoque):
+    """Cria um banco vazio com um cliente e um produto com `estoque` unidades"""
+    app.inicializar(f"sqlite:///{os.path.join(pasta, nome)}")
+    app.cache_cardapio.invalidar()
+    with app.unidade_de_trabalho() as sessao:
+        cliente = app.Cliente('Cliente Teste', '00000000000', 30, None)
+        pao = app.EstoqueItem('Pão', estoque, '1.00')
+        produto = app.Produto('Hambúrguer', '25.00', estoque, ingredientes={pao: 1})
+        sessao.add_all([cliente, produto])
+        sessao.flush()
+        return cliente.id, produto.id
+
+# ====== DADOS SINTÉTICOS ======
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago', 'Vitória', 'William']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Almeida', 'Ribeiro', 'Gomes']
+CARGOS = ['Garçom', 'Cozinheiro', 'Caixa', 'Gerente', 'Auxiliar de Cozinha', 'Entregador']
+INGREDIENTES = ['Pão', 'Carne', 'Queijo', 'Alface', 'Tomate', 'Bacon', 'Frango', 'Batata', 'Arroz', 'Feijão',
+                'Farinha', 'Ovo', 'Leite', 'Café', 'Refrigerante', 'Suco', 'Cebola', 'Molho', 'Presunto', 'Massa']
+TIPOS_PAGAMENTO = ['dinheiro', 'pix', 'cartão de crédito', 'cartão de débito']
+
+def _nome(aleatorio):
+    return f"{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)}"
+
+def _nascimento(aleatorio, hoje):
+    idade = aleatorio.randint(16, 80)
+    return idade, hoje - timedelta(days=idade * 365 + aleatorio.randint(0, 364))
+
+def _inserir(conexao, modelo, registros, tamanho_lote=5000):
+    for inicio in range(0, len(registros), tamanho_lote):
+        conexao.execute(insert(modelo.__table__), registros[inicio:inicio + tamanho_lote])
+
+def gerar_dados(clientes=1000, meses=3, semente=42):
+    """Preenche o banco em uso; devolve as quantidades geradas por tabela.
+
+    Grava direto pelas tabelas em lotes (sem o ORM) e no fim recalcula os
+    resumos de vendas, que a gravação em lote não atualiza.
+    """
+    aleatorio = random.Random(semente)
+    hoje = date.today()
+    funcionarios = max(5, clientes // 20)
+    produtos = max(20, clientes // 50)
+    dias = meses * 30
+    pedidos_por_dia = max(1, clientes * 5 // dias)
+
+    with app.obter_engine().begin() as conexao:
+        base_cliente = conexao.execute(select(func.coalesce(func.max(app.Cliente.id), 0))).scalar()
+        registros = []
+        for numero in range(clientes):
+            idade, nascimento = _nascimento(aleatorio, hoje)
+            registros.append({'nome': _nome(aleatorio), 'cpf': f'{base_cliente + numero + 1:011d}',
+                              'idade': idade, 'data_nascimento': nascimento})
+        _inserir(conexao, app.Cliente, registros)
+        cpfs = dict(conexao.execute(select(app.Cliente.id, app.Cliente._cpf).where(app.Cliente.id > base_cliente)).all())
+        clientes_ids = list(cpfs)
+
+        base_funcionario = conexao.execute(select(func.coalesce(func.max(app.Funcionario.id), 0))).scalar()
+        registros = []
+        for numero in range(funcionarios):
+            idade, nascimento = _nascimento(aleatorio, hoje)
+            registros.append({'nome': _nome(aleatorio), 'cpf': f'9{base_funcionario + numero + 1:010d}',
+                              'idade': idade, 'data_nascimento': nascimento, 'cargo': aleatorio.choice(CARGOS),
+                              'salario_centavos': Decimal(aleatorio.randint(150000, 900000)) / 100})
+        _inserir(conexao, app.Funcionario, registros)
+
+        base_estoque = conexao.execute(select(func.coalesce(func.max(app.EstoqueItem.id), 0))).scalar()
+        _inserir(conexao, app.EstoqueItem, [
+            {'nome': f'{ingrediente} {base_estoque + numero + 1}', 'quantidade': 10 ** 9,
+             'valor_centavos': Decimal(aleatorio.randint(50, 5000)) / 100}
+            for numero, ingrediente in enumerate(INGREDIENTES)
+        ])
+        estoque_ids = list(conexao.scalars(select(app.EstoqueItem.id).where(app.EstoqueItem.id > base_estoque)))
+
+        base_produto = conexao.execute(select(func.coalesce(func.max(app.Produto.id), 0))).scalar()
+        base_cardapio = conexao.execute(select(func.coalesce(func.max(app.CardapioItem.id), 0))).scalar()
+        precos = [Decimal(aleatorio.randint(500, 9000)) / 100 for _ in range(produtos)]
+        nomes = [f'Prato {base_produto + numero + 1}' for numero in range(produtos)]
+        _inserir(conexao, app.CardapioItem, [{'nome': nome, 'valor_centavos': preco} for nome, preco in zip(nomes, precos)])
+        cardapio_ids = conexao.scalars(
+            select(app.CardapioItem.id).where(app.CardapioItem.id > base_cardapio).order_by(app.CardapioItem.id)
+        ).all()
+        _inserir(conexao, app.Produto, [
+            {'nome': nome, 'valor_centavos': preco, 'quantidade': aleatorio.randint(0, 50), 'cardapio_item_id': cardapio_id}
+            for nome, preco, cardapio_id in zip(nomes, precos, cardapio_ids)
+        ])
+        produtos_ids = list(conexao.scalars(select(app.Produto.id).where(app.Produto.id > base_produto)))
+        _inserir(conexao, app.Receita, [
+            {'produto_id': produto_id, 'estoque_item_id': estoque_id, 'quantidade': aleatorio.randint(1, 3)}
+            for produto_id in produtos_ids
+            for estoque_id in aleatorio.sample(estoque_ids, aleatorio.randint(1, 4))
+        ])
+        preco_de = dict(zip(produtos_ids, precos))
+
+        proximo_pedido = conexao.execute(select(func.coalesce(func.max(app.Pedido.id), 0))).scalar() + 1
+        comandas = {}
+        pedidos, itens, pagamentos = [], [], []
+        inicio = datetime.combine(hoje - timedelta(days=dias), datetime.min.time())
+        for dia in range(dias):
+            for _ in range(pedidos_por_dia):
+                criado_em = inicio + timedelta(days=dia, seconds=aleatorio.randint(11 * 3600, 23 * 3600))
+                cliente_id = aleatorio.choice(clientes_ids)
+                comandas[cliente_id] = comandas.get(cliente_id, 0) + 1
+                valor = Decimal('0.00')
+                for produto_id in aleatorio.sample(produtos_ids, aleatorio.randint(1, 4)):
+                    quantidade = aleatorio.randint(1, 3)
+                    valor += preco_de[produto_id] * quantidade
+                    itens.append({'pedido_id': proximo_pedido, 'produto_id': produto_id, 'quantidade': quantidade,
+                                  'valor_unitario_centavos': preco_de[produto_id]})
+                pedidos.append({'id': proximo_pedido, 'cliente_id': cliente_id, 'valor_centavos': valor,
+                                'comanda': f"CPF: {cpfs[cliente_id][-3:]}\nPedidos: {comandas[cliente_id]}",
+                                'criado_em': criado_em})
+                pagamentos.append({'cliente_id': cliente_id, 'tipo': aleatorio.choice(TIPOS_PAGAMENTO),
+                                   'valor_centavos': valor, 'criado_em': criado_em + timedelta(minutes=aleatorio.randint(5, 90))})
+                proximo_pedido += 1
+        _inserir(conexao, app.Pedido, pedidos)
+        _inserir(conexao, app.ItemPedido, itens)
+        _inserir(conexao, app.Pagamento, pagamentos)
+
+    app.reconstruir_resumos()
+    app.cache_cardapio.invalidar()
+    return {'clientes': clientes, 'funcionarios': funcionarios, 'produtos': produtos,
+            'pedidos': len(pedidos), 'itens_pedido': len(itens), 'pagamentos': len(pagamentos)}
+
+def comando_gerar(argumentos):
+    app.inicializar(argumentos.banco)
+    inicio = time.perf_counter()
+    quantidades = gerar_dados(argumentos.clientes, argumentos.meses, argumentos.semente)
+    resumo = ', '.join(f'{quantidade} {tabela}' for tabela, quantidade in quantidades.items())
+    print(f"Gerados {resumo} em {time.perf_counter() - inicio:.1f}s.")
+    return True
+
+# ====== MEDIÇÕES ======
+def cronometrar(funcao, repeticoes):
+    """Roda a função `repeticoes` vezes, cada uma numa sessão nova; tempos em ms"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        try:
+            funcao()
+        finally:
+            app.session.remove()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        'repeticoes': repeticoes,
+        'min_ms': round(min(tempos), 3),
+        'mediana_ms': round(statistics.median(tempos), 3),
+        'media_ms': round(statistics.fmean(tempos), 3),
+        'max_ms': round(max(tempos), 3),
+    }
+
+def operacoes(aleatorio):
+    """Operações medidas: (nome, função sem argumentos)"""
+    hoje = date.today()
+    inicio_mes = hoje - timedelta(days=30)
+    clientes_ids = app.session.scalars(select(app.Cliente.id).limit(1000)).all()
+    produtos_ids = app.session.scalars(select(app.Receita.produto_id).distinct()).all()
+    meio = app.session.query(app.Pagamento.id).order_by(app.Pagamento.id)
+    meio = meio.offset(meio.count() // 2).limit(1).scalar()
+    app.session.remove()
+    app.buscar('clientes', '')  # carrega o índice de busca antes de cronometrar
+
+    def criar_pedido():
+        app.criar_pedido(aleatorio.choice(clientes_ids),
+                         [(produto_id, aleatorio.randint(1, 3)) for produto_id in aleatorio.sample(produtos_ids, 2)])
+
+    def listagem_clientes():
+        consulta = app.session.query(app.Cliente)
+        return list(app.pagina_keyset(consulta, app.Cliente._nome, app.Cliente.id, tamanho=21))
+
+    def relatorio_clientes():
+        app.Cliente.total_clientes_cadastrados()
+        app.Cliente.histograma_faixas_etarias()
+        return app.Cliente.clientes_por_faixa_etaria(18, 30)
+
+    def relatorio_estoque():
+        app.Produto.produtos_abaixo_estoque()
+        for modelo in (app.Produto, app.EstoqueItem):
+            modelo.valor_total_estoque()
+            modelo.valor_estoque_por_item(limite=5)
+
+    return [
+        ('criar_pedido', criar_pedido),
+        ('listagem_clientes', listagem_clientes),
+        ('busca_clientes_prefixo', lambda: app.buscar('clientes', aleatorio.choice(NOMES)[:3])),
+        ('busca_clientes_cpf', lambda: app.buscar('clientes', f'{aleatorio.randint(0, 9999):04d}')),
+        ('busca_cardapio_aproximada', lambda: app.buscar('cardapio', 'prat')),
+        ('listagem_pagamentos', lambda: app.Pagamento.listar(limite=20)),
+        ('listagem_pagamentos_meio', lambda: app.Pagamento.listar(apos_id=meio, limite=20)),
+        ('listagem_pagamentos_por_tipo', lambda: app.Pagamento.listar(tipo='pix', limite=20)),
+        ('relatorio_clientes', relatorio_clientes),
+        ('relatorio_funcionarios', app.Funcionario.resumo_por_cargo),
+        ('relatorio_estoque', relatorio_estoque),
+        ('relatorio_vendas_do_dia', lambda: app.ResumoVendasHora.do_dia(hoje)),
+        ('relatorio_vendas_por_periodo', lambda: app.ResumoVendasDia.periodo(inicio_mes, hoje)),
+        ('relatorio_formas_de_pagamento', lambda: app.ResumoPagamentosDia.mix(inicio_mes, hoje)),
+        ('relatorio_mais_vendidos', lambda: app.ResumoProdutosDia.mais_vendidos(inicio_mes, hoje)),
+        ('relatorio_fechamento_do_dia', lambda: app.fechamento_do_dia(hoje - timedelta(days=1))),
+    ]
+
+def medir(pasta, clientes, meses, repeticoes, semente):
+    app.inicializar(f"sqlite:///{os.path.join(pasta, f'medir_{clientes}.db')}")
+    app.cache_cardapio.invalidar()
+    inicio = time.perf_counter()
+    quantidades = gerar_dados(clientes, meses, semente)
+    geracao = time.perf_counter() - inicio
+
+    resultados = []
+    for nome, funcao in operacoes(random.Random(semente)):
+        resultado = {'operacao': nome, 'tamanho': clientes, **cronometrar(funcao, repeticoes)}
+        print(f"{clientes:>9} {nome:<32} {resultado['mediana_ms']:>10.3f} {resultado['max_ms']:>10.3f}", file=sys.stderr)
+        resultados.append(resultado)
+    return {'tamanho': clientes, 'quantidades': quantidades, 'geracao_s': round(geracao, 3)}, resultados
+
+def comando_medir(argumentos):
+    print(f"{'Clientes':>9} {'Operação':<32} {'Mediana ms':>10} {'Máximo ms':>10}", file=sys.stderr)
+    relatorio = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'meses': argumentos.meses,
+        'semente': argumentos.semente,
+        'bancos': [],
+        'resultados': [],
+    }
+    with tempfile.TemporaryDirectory() as pasta:
+        for clientes in argumentos.tamanhos:
+            banco, resultados = medir(pasta, clientes, argumentos.meses, argumentos.repeticoes, argumentos.semente)
+            relatorio['bancos'].append(banco)
+            relatorio['resultados'].extend(resultados)
+        app.configurar_banco()
+
+    dados = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(dados + '\n')
+        print(f"Resultados gravados em {argumentos.saida}.", file=sys.stderr)
+    else:
+        print(dados)
+    return True
+
+# ====== ESTRESSE DE ESTOQUE ======
+def _vender(cliente_id, produto_id):
+    try:
+        app.criar_pedido(cliente_id, [(produto_id, 1)])
+        return 'vendido'
+    except app.EstoqueInsuficienteError:
+        return 'sem estoque'
+    except Exception as erro:
+        return f'erro: {type(erro).__name__}: {erro}'
+    finally:
+        app.session.remove()
+
+def estresse_estoque(pasta, workers, pedidos, estoque):
+    cliente_id, produto_id = preparar_banco(pasta, f'estresse_{workers}.db', estoque)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        resultados = list(executor.map(lambda _: _vender(cliente_id, produto_id), range(pedidos)))
+    duracao = time.perf_counter() - inicio
+
+    with app.unidade_de_trabalho() as sessao:
+        restante = sessao.query(app.EstoqueItem._quantidade).filter_by(_nome='Pão').scalar()
+        gravados = sessao.query(app.Pedido).count()
+    vendidos = resultados.count('vendido')
+    erros = [resultado for resultado in resultados if resultado.startswith('erro')]
+
+    problemas = []
+    if restante < 0:
+        problemas.append(f'estoque negativo ({restante})')
+    if vendidos != gravados or estoque - restante != gravados:
+        problemas.append(f'{vendidos} vendas, {gravados} pedidos gravados, {estoque - restante} unidades baixadas')
+    if erros:
+        problemas.append(f'{len(erros)} erros, ex.: {erros[0]}')
+
+    print(f"{workers:>7} {vendidos:>8} {resultados.count('sem estoque'):>11} {restante:>8} "
+          f"{duracao:>8.2f}s {pedidos / duracao:>10.1f}  {'; '.join(problemas) or 'ok'}")
+    return not problemas
+
+def comando_estresse(argumentos):
+    print(f"{argumentos.pedidos} pedidos de 1 unidade contra {argumentos.estoque} em estoque\n")
+    print(f"{'Workers':>7} {'Vendidos':>8} {'Sem estoque':>11} {'Restante':>8} {'Tempo':>9} {'Pedidos/s':>10}  Situação")
+    with tempfile.TemporaryDirectory() as pasta:
+        resultados = [
+            estresse_estoque(pasta, workers, argumentos.pedidos, argumentos.estoque)
+            for workers in argumentos.workers
+        ]
+        app.configurar_banco()
+    return all(resultados)
+
+# ====== GRAVAÇÃO EM LOTE ======
+def _escrever(cliente_id, estoque_id, numero, esperar):
+    """Metade das operações são pagamentos, metade ajustes de estoque"""
+    try:
+        if numero % 2:
+            app.alterar_item_estoque(estoque_id, quantidade=numero, esperar=esperar)
+        else:
+            app.efetuar_pagamento(cliente_id, 'pix', '10.00', esperar=esperar)
+    finally:
+        app.session.remove()
+
+def vazao_escrita(pasta, sincronizacao, modo, operacoes, workers):
+    """Operações por segundo num banco novo; modo: imediato, lote ou lote-sem-espera"""
+    app.definir_sincronizacao(sincronizacao)
+    preparar_banco(pasta, f'lote_{sincronizacao}_{modo}_{workers}.db', 1)
+    with app.unidade_de_trabalho() as sessao:
+        cliente_id = sessao.query(app.Cliente.id).scalar()
+        estoque_id = sessao.query(app.EstoqueItem.id).scalar()
+    if modo != 'imediato':
+        app.gravacao_em_lote.ativar()
+
+    esperar = modo != 'lote-sem-espera'
+    inicio = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda numero: _escrever(cliente_id, estoque_id, numero, esperar), range(operacoes)))
+        app.gravacao_em_lote.descarregar()
+        duracao = time.perf_counter() - inicio
+        estatisticas = app.gravacao_em_lote.estatisticas()
+    finally:
+        app.gravacao_em_lote.desativar()
+        app.gravacao_em_lote.lotes = app.gravacao_em_lote.operacoes = 0
+
+    with app.unidade_de_trabalho() as sessao:
+        gravados = sessao.query(app.Pagamento).count()
+    esperados = (operacoes + 1) // 2
+    return {
+        'sincronizacao': sincronizacao,
+        'modo': modo,
+        'workers': workers,
+        'operacoes': operacoes,
+        'duracao_s': round(duracao, 3),
+        'operacoes_por_s': round(operacoes / duracao, 1),
+        'media_por_lote': estatisticas['media_por_lote'],
+        'ok': gravados == esperados and not app.gravacao_em_lote.falhas,
+    }
+
+def comando_lote(argumentos):
+    cenarios = [('imediato', 1), ('lote-sem-espera', 1), ('imediato', argumentos.workers), ('lote', argumentos.workers)]
+    print(f"{argumentos.operacoes} escritas por cenário; lote de até {app.gravacao_em_lote.max_operacoes} "
+          f"operações ou {app.gravacao_em_lote.janela_ms:g} ms\n")
+    print(f"{'Synchronous':<12} {'Modo':<16} {'Workers':>7} {'Tempo':>9} {'Oper./s':>10} {'Por lote':>9}  Situação")
+    sincronizacao_original = app.PRAGMAS_SQLITE['synchronous']
+    resultados = []
+    with tempfile.TemporaryDirectory(dir=argumentos.pasta) as pasta:
+        for sincronizacao in argumentos.sincronizacao:
+            base = None
+            for modo, workers in cenarios:
+                resultado = vazao_escrita(pasta, sincronizacao, modo, argumentos.operacoes, workers)
+                base = base or resultado['operacoes_por_s']
+                print(f"{sincronizacao:<12} {modo:<16} {workers:>7} {resultado['duracao_s']:>8.2f}s "
+                      f"{resultado['operacoes_por_s']:>10.1f} {resultado['media_por_lote'] or '-':>9}  "
+                      f"{'ok' if resultado['ok'] else 'pagamentos perdidos'} ({resultado['operacoes_por_s'] / base:.1f}x)")
+                resultados.append(resultado)
+        app.definir_sincronizacao(sincronizacao_original)
+        app.configurar_banco()
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+    return all(resultado['ok'] for resultado in resultados)
+
+# ====== TEMPO DE INICIALIZAÇÃO ======
+def _subir_processo(codigo, pasta, ambiente):
+    """(tempo de parede do processo, tempo acumulado de `import app`), em ms"""
+    inicio = time.perf_counter()
+    resultado = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo], cwd=pasta, env=ambiente,
+                               capture_output=True, text=True, check=True)
+    parede = (time.perf_counter() - inicio) * 1000
+    for linha in resultado.stderr.splitlines():
+        partes = linha.split('|')
+        if len(partes) == 3 and partes[2].strip() == 'app':
+            return parede, int(partes[1]) / 1000
+    raise RuntimeError(f"import app não apareceu na saída do -X importtime: {resultado.stderr[-200:]}")
+
+def comando_inicio(argumentos):
+    cenarios = [('import app', 'import app'), ('import + inicializar()', 'import app; app.inicializar()')]
+    print(f"Mediana de {argumentos.repeticoes} processos, banco já na versão {app.VERSAO_ATUAL}\n")
+    print(f"{'Cenário':<24} {'Processo ms':>12} {'import app ms':>14}")
+    with tempfile.TemporaryDirectory() as pasta:
+        url = f"sqlite:///{os.path.join(pasta, 'inicio.db')}"
+        app.inicializar(url)
+        app.configurar_banco()
+        ambiente = {**os.environ, 'RESTAURANTE_DB_URL': url,
+                    'PYTHONPATH': os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(app.__file__)),
+                                                                os.environ.get('PYTHONPATH')]))}
+        for rotulo, codigo in cenarios:
+            tempos = [_subir_processo(codigo, pasta, ambiente) for _ in range(argumentos.repeticoes)]
+            print(f"{rotulo:<24} {statistics.median(t[0] for t in tempos):>12.1f} "
+                  f"{statistics.median(t[1] for t in tempos):>14.1f}")
+    return True
+
+# ====== LINHA DE COMANDO ======
+def _lista_inteiros(texto):
+    return [int(parte) for parte in texto.split(',')]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Testes de carga do sistema do restaurante')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    sub = comandos.add_parser('gerar', help='preenche um banco com dados sintéticos')
+    sub.add_argument('--banco', help='URL do banco (padrão: o mesmo do app.py)')
+    sub.add_argument('--clientes', type=int, default=1000)
+    sub.add_argument('--meses', type=int, default=3, help='meses de pedidos e pagamentos')
+    sub.add_argument('--semente', type=int, default=42)
+    sub.set_defaults(funcao=comando_gerar)
+
+    sub = comandos.add_parser('medir', help='cronometra as operações principais em vários tamanhos de banco')
+    sub.add_argument('--tamanhos', type=_lista_inteiros, default=[1000, 10000], help='número de clientes, ex.: 1000,10000')
+    sub.add_argument('--meses', type=int, default=3)
+    sub.add_argument('--repeticoes', type=int, default=20)
+    sub.add_argument('--semente', type=int, default=42)
+    sub.add_argument('--saida', help='arquivo .json (padrão: saída padrão)')
+    sub.set_defaults(funcao=comando_medir)
+
+    sub = comandos.add_parser('estresse', help='pedidos concorrentes disputando o mesmo estoque')
+    sub.add_argument('--workers', type=_lista_inteiros, default=[1, 2, 4, 8], help='ex.: 1,2,4,8')
+    sub.add_argument('--pedidos', type=int, default=400)
+    sub.add_argument('--estoque', type=int, default=300)
+    sub.set_defaults(funcao=comando_estresse)
+
+    sub = comandos.add_parser('lote', help='vazão de escritas com e sem a gravação em lote')
+    sub.add_argument('--operacoes', type=int, default=2000)
+    sub.add_argument('--workers', type=int, default=8, help='workers esperando o commit no cenário concorrente')
+    sub.add_argument('--sincronizacao', type=lambda texto: texto.upper().split(','), default=['NORMAL', 'FULL'],
+                     help='níveis do PRAGMA synchronous, ex.: NORMAL,FULL')
+    sub.add_argument('--pasta', help='onde criar os bancos temporários (padrão: pasta temporária do sistema)')
+    sub.add_argument('--saida', help='arquivo .json com os resultados')
+    sub.set_defaults(funcao=comando_lote)
+
+    sub = comandos.add_parser('inicio', help='tempo de import do app.py e de inicializar()')
+    sub.add_argument('--repeticoes', type=int, default=30)
+    sub.set_defaults(funcao=comando_inicio)
+
+    argumentos = parser.parse_args(argv)
+    return 0 if argumentos.funcao(argumentos) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
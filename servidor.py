@@ -0,0 +1,258 @@
+"""Servidor HTTP/JSON assíncrono sobre os serviços do app.py.
+
+Uso: python servidor.py [--host 127.0.0.1] [--porta 8080] [--workers 8]
+
+O laço asyncio cuida das conexões (com keep-alive) e cada operação no banco
+roda num pool de threads, cada thread com a sua própria sessão.
+
+Rotas:
+    GET  /cardapio
+    GET  /cardapio/cache    (acertos e falhas do cache do cardápio)
+    GET  /instrumentacao    (consultas e tempo de banco por operação, se ligada)
+    GET  /estoque
+    GET  /clientes/<cpf>
+    GET  /busca/<clientes|cardapio|estoque>?q=&limite=   (autocompletar)
+    POST /clientes          {"nome", "cpf", "idade", "data_nascimento": "AAAA-MM-DD"}
+    POST /pedidos           {"cliente_id", "itens": [{"produto_id", "quantidade"}]}
+    POST /estoque/reservas  {"itens": [{"produto_id", "quantidade"}]}
+    GET  /pagamentos        ?tipo=&cliente_id=&valor_min=&valor_max=&apos_id=&limite=
+    POST /pagamentos        {"cliente_id", "tipo", "valor"}
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import app
+
+ROTAS = []
+log = logging.getLogger('restaurante.servidor')
+
+def rota(metodo, padrao):
+    def registrar(funcao):
+        ROTAS.append((metodo, re.compile(f'^{padrao}$'), funcao))
+        return funcao
+    return registrar
+
+# ====== CONVERSÃO PARA JSON ======
+def _cliente(cliente):
+    return {
+        'id': cliente.id,
+        'nome': cliente.nome,
+        'cpf': cliente.cpf,
+        'idade': cliente.idade,
+        'data_nascimento': cliente.data_nascimento.isoformat() if cliente.data_nascimento else None,
+    }
+
+def _pedido(pedido):
+    return {
+        'id': pedido.id,
+        'cliente_id': pedido.cliente_id,
+        'comanda': pedido.comanda,
+        'valor': pedido.valor,
+        'itens': [
+            {'produto_id': item.produto_id, 'quantidade': item.quantidade, 'valor_unitario': item.valor_unitario}
+            for item in pedido.itens
+        ],
+    }
+
+def _itens(corpo):
+    return [(item['produto_id'], item.get('quantidade', 1)) for item in corpo['itens']]
+
+def _opcional(consulta, nome, tipo):
+    valor = consulta.get(nome)
+    return tipo(valor[0]) if valor else None
+
+# ====== ROTAS ======
+@rota('GET', '/cardapio')
+def listar_cardapio(corpo, consulta):
+    return HTTPStatus.OK, [{'id': item.id, 'nome': item.nome, 'valor': item.valor} for item in app.cardapio_em_cache()]
+
+@rota('GET', '/cardapio/cache')
+def estatisticas_cache(corpo, consulta):
+    return HTTPStatus.OK, app.cache_cardapio.estatisticas()
+
+@rota('GET', '/instrumentacao')
+def resumo_instrumentacao(corpo, consulta):
+    return HTTPStatus.OK, {
+        'ativa': app.instrumentacao.ativa,
+        'operacoes': [linha._asdict() for linha in app.instrumentacao.resumo()],
+        'suspeitas_n_mais_1': [
+            {'operacao': operacao, 'sql': sql, 'repeticoes': vezes}
+            for (operacao, sql), vezes in app.instrumentacao.suspeitas.items()
+        ],
+        'gravacao_em_lote': app.gravacao_em_lote.estatisticas(),
+    }
+
+@rota('GET', '/estoque')
+def listar_estoque(corpo, consulta):
+    itens = app.session.query(app.EstoqueItem).order_by(app.EstoqueItem._nome)
+    return HTTPStatus.OK, [
+        {'id': item.id, 'nome': item.nome, 'quantidade': item.quantidade, 'valor': item.valor} for item in itens
+    ]
+
+@rota('GET', '/busca/(?P<entidade>clientes|cardapio|estoque)')
+def buscar(corpo, consulta, entidade):
+    texto = _opcional(consulta, 'q', str) or ''
+    limite = min(_opcional(consulta, 'limite', int) or 10, 100)
+    return HTTPStatus.OK, [resultado._asdict() for resultado in app.buscar(entidade, texto, limite)]
+
+@rota('GET', '/clientes/(?P<cpf>[^/]+)')
+def obter_cliente(corpo, consulta, cpf):
+    return HTTPStatus.OK, _cliente(app.buscar_cliente_por_cpf(cpf))
+
+@rota('POST', '/clientes')
+def criar_cliente(corpo, consulta):
+    data_nascimento = corpo.get('data_nascimento')
+    cliente = app.cadastrar_cliente(
+        corpo['nome'], corpo['cpf'], int(corpo['idade']),
+        date.fromisoformat(data_nascimento) if data_nascimento else None,
+    )
+    return HTTPStatus.CREATED, _cliente(cliente)
+
+@rota('POST', '/pedidos')
+def criar_pedido(corpo, consulta):
+    pedido = app.criar_pedido(int(corpo['cliente_id']), _itens(corpo))
+    return HTTPStatus.CREATED, _pedido(pedido)
+
+@rota('POST', '/estoque/reservas')
+def reservar_estoque(corpo, consulta):
+    return HTTPStatus.OK, app.reservar_produtos(_itens(corpo))
+
+@rota('GET', '/pagamentos')
+def listar_pagamentos(corpo, consulta):
+    pagamentos = app.Pagamento.listar(
+        tipo=_opcional(consulta, 'tipo', str),
+        cliente_id=_opcional(consulta, 'cliente_id', int),
+        valor_min=_opcional(consulta, 'valor_min', app.para_dinheiro),
+        valor_max=_opcional(consulta, 'valor_max', app.para_dinheiro),
+        apos_id=_opcional(consulta, 'apos_id', int),
+        limite=min(_opcional(consulta, 'limite', int) or 50, 500),
+    )
+    return HTTPStatus.OK, [
+        {'id': p.id, 'cliente': p.cliente, 'tipo': p.tipo, 'valor': p.valor} for p in pagamentos
+    ]
+
+@rota('POST', '/pagamentos')
+def criar_pagamento(corpo, consulta):
+    pagamento = app.efetuar_pagamento(int(corpo['cliente_id']), corpo['tipo'], corpo['valor'])
+    return HTTPStatus.CREATED, {
+        'id': pagamento.id, 'cliente_id': pagamento.cliente_id, 'tipo': pagamento.tipo, 'valor': pagamento.valor,
+    }
+
+# ====== DESPACHO ======
+def _executar(funcao, corpo, consulta, parametros):
+    """Roda a rota numa thread do pool e traduz as exceções do domínio em status HTTP"""
+    try:
+        with app.instrumentacao.operacao(f'http {funcao.__name__}'):
+            return funcao(corpo, consulta, **parametros)
+    except app.EstoqueInsuficienteError as erro:
+        faltantes = {nome: {'solicitado': pedido, 'disponivel': disponivel}
+                     for nome, (pedido, disponivel) in erro.faltantes.items()}
+        return HTTPStatus.CONFLICT, {'erro': str(erro), 'faltantes': faltantes}
+    except app.RegistroDuplicadoError as erro:
+        return HTTPStatus.CONFLICT, {'erro': str(erro)}
+    except app.RegistroNaoEncontradoError as erro:
+        return HTTPStatus.NOT_FOUND, {'erro': str(erro)}
+    except (ValueError, KeyError, TypeError) as erro:
+        return HTTPStatus.BAD_REQUEST, {'erro': f'Requisição inválida: {erro}'}
+    except Exception:
+        log.exception('Erro ao atender %s', funcao.__name__)
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {'erro': 'Erro interno do servidor.'}
+    finally:
+        app.session.remove()
+
+async def despachar(metodo, alvo, corpo_bruto):
+    url = urlsplit(alvo)
+    caminho_existe = False
+    for metodo_rota, padrao, funcao in ROTAS:
+        encontrado = padrao.match(url.path)
+        if not encontrado:
+            continue
+        caminho_existe = True
+        if metodo_rota != metodo:
+            continue
+        try:
+            corpo = json.loads(corpo_bruto) if corpo_bruto else {}
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {'erro': 'Corpo JSON inválido.'}
+        consulta = parse_qs(url.query)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _executar, funcao, corpo, consulta, encontrado.groupdict())
+    if caminho_existe:
+        return HTTPStatus.METHOD_NOT_ALLOWED, {'erro': f'Método {metodo} não permitido.'}
+    return HTTPStatus.NOT_FOUND, {'erro': f'Rota {url.path} não encontrada.'}
+
+async def atender(leitor, escritor):
+    """Atende uma conexão HTTP/1.1, mantendo-a aberta entre requisições (keep-alive)"""
+    try:
+        while True:
+            linha = await leitor.readline()
+            if not linha:
+                break
+            try:
+                metodo, alvo, versao = linha.decode('latin-1').split()
+            except ValueError:
+                break
+
+            cabecalhos = {}
+            while True:
+                linha = await leitor.readline()
+                if linha in (b'\r\n', b'\n', b''):
+                    break
+                nome, _, valor = linha.decode('latin-1').partition(':')
+                cabecalhos[nome.strip().lower()] = valor.strip()
+
+            try:
+                tamanho = int(cabecalhos.get('content-length', 0))
+                if tamanho < 0:
+                    raise ValueError(tamanho)
+            except ValueError:
+                # sem saber onde o corpo termina não dá para ler a próxima requisição
+                status, resposta = HTTPStatus.BAD_REQUEST, {'erro': 'Content-Length inválido.'}
+                manter = False
+            else:
+                corpo = await leitor.readexactly(tamanho) if tamanho else b''
+                status, resposta = await despachar(metodo.upper(), alvo, corpo)
+                manter = versao == 'HTTP/1.1' and cabecalhos.get('connection', '').lower() != 'close'
+
+            # Decimal (dinheiro) vai como texto para não perder centavos
+            dados = json.dumps(resposta, ensure_ascii=False, default=str).encode('utf-8')
+            escritor.write(
+                f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                f'Content-Type: application/json; charset=utf-8\r\n'
+                f'Content-Length: {len(dados)}\r\n'
+                f'Connection: {"keep-alive" if manter else "close"}\r\n\r\n'.encode('latin-1') + dados
+            )
+            await escritor.drain()
+            if not manter:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        escritor.close()
+
+async def servir(host, porta, workers):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+    servidor = await asyncio.start_server(atender, host, porta)
+    print(f'Servidor ouvindo em http://{host}:{porta} ({workers} workers)')
+    async with servidor:
+        await servidor.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor HTTP/JSON do sistema do restaurante')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=8)
+    argumentos = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    app.inicializar()
+    try:
+        asyncio.run(servir(argumentos.host, argumentos.porta, argumentos.workers))
+    except KeyboardInterrupt:
+        pass